@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Queued by `stop` so the flusher writes everything before it and then exits
+_STOP = object()
+
+
+class ActivityLog:
+    """Write-behind audit trail of create, update and delete actions.
+
+    Handlers hand entries to an in-process queue and carry on; a background
+    task writes them with one insert_many per batch, once `batch_size`
+    entries are waiting or `flush_interval` seconds have passed since the
+    first one. The queue holds at most `max_queued` entries: when the
+    flusher falls that far behind, `record` waits for room instead of
+    growing memory without bound.
+    """
+
+    def __init__(self, repository, batch_size: int = 100, flush_interval: float = 1.0, max_queued: int = 10_000):
+        self.repository = repository
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queued = max_queued
+        self.written = 0
+        self.failed = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        # The queue is bound to the running loop, so it is created here rather than at import
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._flusher = asyncio.create_task(self._run())
+
+    async def record(self, tenant_id: str, actor: dict, action: str, entity_type: str, entity_id: str) -> None:
+        entry = {
+            "id": str(uuid.uuid4()),
+            "tenant_id": tenant_id,
+            "actor_id": actor.get('id'),
+            "actor": actor.get('sub'),
+            "action": action,
+            "entity_type": entity_type,
+            "entity_id": entity_id,
+            "at": datetime.now(timezone.utc).isoformat(),
+        }
+        if self._queue is None:
+            # Not started (e.g. a script importing the app): write through
+            await self.repository.insert_many([entry])
+            return
+        try:
+            self._queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            await self._queue.put(entry)
+
+    async def _next_batch(self) -> Tuple[List[dict], bool]:
+        """Collect the next batch; the flag is True once the stop marker was reached."""
+        first = await self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = asyncio.get_running_loop().time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                entry = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if entry is _STOP:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    async def _write(self, batch: List[dict]) -> None:
+        try:
+            await self.repository.insert_many(batch)
+            self.written += len(batch)
+        except Exception:
+            self.failed += len(batch)
+            logger.exception(f"Failed to write {len(batch)} activity entries")
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._next_batch()
+            if batch:
+                await self._write(batch)
+
+    async def stop(self) -> None:
+        """Write whatever is still queued, then stop the flusher."""
+        if self._flusher is None:
+            return
+        await self._queue.put(_STOP)
+        await self._flusher
+        self._flusher = None
+        self._queue = None
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "written": self.written,
+            "failed": self.failed,
+        }
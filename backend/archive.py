@@ -0,0 +1,73 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from cache import LRUCache
+from repositories import TenantRepositories
+
+logger = logging.getLogger(__name__)
+
+# Settled documents matching these filters are moved to the *_archive collections
+ARCHIVE_RULES = {
+    "invoices": {"status": "paid"},
+    "projects": {"status": "completed"},
+}
+
+# Archive copies are written staged and only count once their hot document is gone, so a
+# document caught between the two collections by an interrupted run is never seen twice
+SETTLED = {"archiving": {"$ne": True}}
+
+
+async def _settle(hot, archive, ids: List[str]) -> None:
+    # Documents still in the hot collection were changed or kept since they were copied;
+    # the hot copy is current (and is archived again if it still qualifies), so drop theirs
+    kept = [doc['id'] for doc in await hot.find({"id": {"$in": ids}}, {"id": 1}, limit=len(ids))]
+    if kept:
+        await archive.delete_many({"id": {"$in": kept}})
+    await archive.update_many({"id": {"$in": ids}, "archiving": True}, {"archiving": False})
+
+
+async def archive_collection(tenant_repos: TenantRepositories, name: str, cutoff: datetime, batch_size: int = 500,
+                             cache: Optional[LRUCache] = None) -> int:
+    """Move settled documents created before cutoff from `name` to `name_archive` in batches.
+
+    Each batch is upserted into the archive as staged copies, removed from the hot
+    collection only where it still matches the archive rule, and then settled. A
+    run that was interrupted part-way is finished off first, so it can simply be
+    repeated. Archived totals are read from the archive collections themselves,
+    so there is no separate counter to fall out of step.
+    """
+    hot = tenant_repos.collection(name)
+    archive = tenant_repos.collection(f"{name}_archive")
+    query = {**ARCHIVE_RULES[name], "created_at": {"$lt": cutoff.isoformat()}}
+    moved = 0
+
+    while True:
+        staged = await archive.find({"archiving": True}, {"id": 1}, limit=batch_size)
+        if not staged:
+            break
+        await _settle(hot, archive, [doc['id'] for doc in staged])
+
+    while True:
+        batch = await hot.find(query, limit=batch_size)
+        if not batch:
+            break
+
+        await archive.upsert_many([{**doc, "archiving": True} for doc in batch])
+        ids = [doc['id'] for doc in batch]
+        moved += await hot.delete_many({**query, "id": {"$in": ids}})
+        await _settle(hot, archive, ids)
+        if cache is not None:
+            cache.invalidate(tenant_repos.tenant_id, *ids)
+
+    return moved
+
+
+async def archive_tenant(tenant_repos: TenantRepositories, cutoff: datetime, batch_size: int = 500,
+                         caches: Optional[Dict[str, LRUCache]] = None) -> Dict[str, int]:
+    """Run `archive_collection` for every collection in ARCHIVE_RULES; returns the counts moved."""
+    archived = {}
+    for name in ARCHIVE_RULES:
+        archived[name] = await archive_collection(tenant_repos, name, cutoff, batch_size, (caches or {}).get(name))
+    logger.info(f"Archived {archived} for {tenant_repos.tenant_id} (created before {cutoff.isoformat()})")
+    return archived
@@ -0,0 +1,45 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Tuple
+
+
+class LRUCache:
+    """Per-process LRU for hot entity documents, keyed by namespace (the tenant) and id.
+
+    Entries expire after `ttl` seconds so that writes made by other workers
+    become visible without cross-process invalidation.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, dict]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, namespace: str, ids: Iterable[str]) -> Tuple[Dict[str, dict], List[str]]:
+        """Split `ids` into cached documents and ids that still need a lookup."""
+        now = time.monotonic()
+        found, missing = {}, []
+        for entity_id in ids:
+            entry = self._entries.get((namespace, entity_id))
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end((namespace, entity_id))
+                found[entity_id] = entry[1]
+            else:
+                missing.append(entity_id)
+        self.hits += len(found)
+        self.misses += len(missing)
+        return found, missing
+
+    def put_many(self, namespace: str, docs: Iterable[dict]) -> None:
+        expires = time.monotonic() + self.ttl
+        for doc in docs:
+            self._entries[(namespace, doc['id'])] = (expires, doc)
+            self._entries.move_to_end((namespace, doc['id']))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, namespace: str, *ids: str) -> None:
+        for entity_id in ids:
+            self._entries.pop((namespace, entity_id), None)
@@ -0,0 +1,213 @@
+"""Production entry point: `python launcher.py` from the backend directory.
+
+Forks one uvicorn worker per core on a shared socket. Each worker opens its
+Mongo pool and warms its validators during startup, before it accepts
+connections. A worker exits after serving about `--max-requests` requests
+and is replaced, and SIGTERM drains every worker before the launcher exits.
+A worker that dies before it is ready is retried with exponential backoff,
+and the launcher exits with an error after `--max-startup-failures` of those
+in a row (e.g. while Mongo is unreachable) instead of crash-looping.
+
+Behind an ingress or load balancer, set TRUSTED_PROXIES to its addresses or
+CIDR ranges so the auth rate limits see the client's address from
+X-Forwarded-For rather than the proxy's.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+from queue import Empty
+
+import uvicorn
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("launcher")
+
+# Delay before replacing a worker that died during startup, doubling per consecutive failure
+RESPAWN_BACKOFF_SECONDS = 1.0
+RESPAWN_BACKOFF_MAX_SECONDS = 30.0
+
+
+def run_worker(sock: socket.socket, options: dict, ready_queue) -> None:
+    started = time.perf_counter()
+    server = uvicorn.Server(uvicorn.Config("server:app", **options))
+
+    def report_ready():
+        # Server.started flips once the app's startup hooks (pool + warm-up) have finished
+        while not server.started and not server.should_exit:
+            time.sleep(0.01)
+        if server.started:
+            ready_queue.put((os.getpid(), time.perf_counter() - started))
+
+    threading.Thread(target=report_ready, daemon=True).start()
+    server.run(sockets=[sock])
+
+
+class Supervisor:
+    def __init__(self, host: str, port: int, workers: int, max_requests: int, max_requests_jitter: int, graceful_timeout: int, max_startup_failures: int):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.max_startup_failures = max_startup_failures
+        self.context = multiprocessing.get_context("spawn")
+        self.ready_queue = self.context.Queue()
+        self.processes = []
+        self.ready_pids = set()
+        self.startup_failures = []
+        self.respawn_at = []
+        self.stopping = threading.Event()
+
+    def worker_options(self) -> dict:
+        options = {
+            "timeout_graceful_shutdown": self.graceful_timeout,
+            "proxy_headers": True,
+        }
+        if self.max_requests:
+            # Jitter keeps workers from all recycling at the same moment
+            options["limit_max_requests"] = self.max_requests + random.randint(0, self.max_requests_jitter)
+        return options
+
+    def spawn(self) -> multiprocessing.Process:
+        process = self.context.Process(
+            target=run_worker,
+            args=(self.sock, self.worker_options(), self.ready_queue),
+            name="agency-worker"
+        )
+        process.start()
+        return process
+
+    def handle_signal(self, signum, frame):
+        logger.info(f"Received {signal.Signals(signum).name}, draining workers")
+        self.stopping.set()
+
+    def report_ready(self, started: float, pending: int) -> int:
+        while True:
+            try:
+                pid, seconds = self.ready_queue.get_nowait()
+            except Empty:
+                return pending
+            logger.info(f"Worker {pid} ready after {seconds * 1000:.0f} ms")
+            self.ready_pids.add(pid)
+            if pending:
+                pending -= 1
+                if not pending:
+                    logger.info(f"All {self.workers} workers ready in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    def run(self) -> bool:
+        started = time.perf_counter()
+        self.sock = socket.socket(socket.AF_INET6 if ":" in self.host else socket.AF_INET)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.set_inheritable(True)
+
+        signal.signal(signal.SIGTERM, self.handle_signal)
+        signal.signal(signal.SIGINT, self.handle_signal)
+
+        logger.info(f"Starting {self.workers} workers on {self.host}:{self.port}")
+        self.processes = [self.spawn() for _ in range(self.workers)]
+        self.startup_failures = [0] * self.workers
+        self.respawn_at = [None] * self.workers
+        pending = self.workers
+        healthy = True
+
+        while healthy and not self.stopping.wait(0.5):
+            pending = self.report_ready(started, pending)
+            healthy = self.replace_exited_workers()
+
+        self.shutdown()
+        return healthy
+
+    def replace_exited_workers(self) -> bool:
+        """Respawn exited workers; False once one has failed to start too many times in a row."""
+        now = time.monotonic()
+        for index, process in enumerate(self.processes):
+            if process is None:
+                if now >= self.respawn_at[index]:
+                    self.processes[index] = self.spawn()
+                continue
+            if process.is_alive():
+                continue
+
+            if process.pid in self.ready_pids:
+                # A recycled or crashed worker that had served traffic: replace it straight away
+                self.ready_pids.discard(process.pid)
+                self.startup_failures[index] = 0
+                logger.info(f"Worker {process.pid} exited with code {process.exitcode}, replacing it")
+                self.processes[index] = self.spawn()
+                continue
+
+            self.startup_failures[index] += 1
+            failures = self.startup_failures[index]
+            if failures >= self.max_startup_failures:
+                logger.error(f"Worker {process.pid} failed to start {failures} times in a row, giving up")
+                self.processes[index] = None
+                return False
+            delay = min(RESPAWN_BACKOFF_SECONDS * 2 ** (failures - 1), RESPAWN_BACKOFF_MAX_SECONDS)
+            logger.warning(f"Worker {process.pid} exited with code {process.exitcode} before it was ready, retrying in {delay:.0f} s")
+            self.processes[index] = None
+            self.respawn_at[index] = now + delay
+        return True
+
+    def shutdown(self) -> None:
+        # uvicorn stops accepting, finishes in-flight requests and runs the shutdown hooks
+        processes = [process for process in self.processes if process is not None]
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        for process in processes:
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                logger.warning(f"Worker {process.pid} did not drain in time, killing it")
+                process.kill()
+                process.join()
+        self.sock.close()
+        logger.info("All workers stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the agency API with multiple pre-warmed workers")
+    parser.add_argument("--host", default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument("--port", type=int, default=int(os.environ.get('PORT', '8001')))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1)))
+    parser.add_argument("--max-requests", type=int, default=int(os.environ.get('MAX_REQUESTS', '10000')),
+                        help="recycle a worker after this many requests, 0 to disable")
+    parser.add_argument("--max-requests-jitter", type=int, default=int(os.environ.get('MAX_REQUESTS_JITTER', '1000')))
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.environ.get('GRACEFUL_TIMEOUT', '30')),
+                        help="seconds a worker may spend finishing in-flight requests on shutdown")
+    parser.add_argument("--max-startup-failures", type=int, default=int(os.environ.get('MAX_STARTUP_FAILURES', '5')),
+                        help="exit once a worker has failed to start this many times in a row")
+    args = parser.parse_args()
+
+    # Workers import server.py from this directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    # Spawned workers inherit the environment: keep a few Mongo connections open per worker
+    # so they are already established when traffic arrives
+    os.environ.setdefault('MONGO_MIN_POOL_SIZE', '10')
+
+    healthy = Supervisor(
+        host=args.host,
+        port=args.port,
+        workers=max(args.workers, 1),
+        max_requests=args.max_requests,
+        max_requests_jitter=args.max_requests_jitter,
+        graceful_timeout=args.graceful_timeout,
+        max_startup_failures=max(args.max_startup_failures, 1),
+    ).run()
+    sys.exit(0 if healthy else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Data migrations and maintenance jobs: `python migrate.py <migration>` from the backend directory.
+
+backfill-tenant  Assign documents written before multi-tenancy to DEFAULT_TENANT_ID.
+                 Run once when upgrading an existing database; it scans every
+                 tenant-owned collection, so it is kept out of worker startup.
+archive          Move paid invoices and completed projects older than
+                 ARCHIVE_AFTER_DAYS to the *_archive collections, for every
+                 agency (or one with --tenant-id). Meant to be scheduled, e.g.
+                 nightly from cron; it is safe to rerun after an interruption.
+"""
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from archive import archive_tenant
+from repositories import create_motor_repositories
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("migrate")
+
+
+async def backfill_tenant(tenant_id: str) -> None:
+    repos = create_motor_repositories(os.environ['MONGO_URL'], os.environ['DB_NAME'])
+    try:
+        backfilled = await repos.backfill_tenant(tenant_id)
+        logger.info(f"Assigned documents without a tenant to {tenant_id}: {backfilled}")
+    finally:
+        repos.close()
+
+
+async def archive(older_than_days: int, batch_size: int, tenant_id: Optional[str]) -> None:
+    repos = create_motor_repositories(os.environ['MONGO_URL'], os.environ['DB_NAME'])
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    try:
+        # Workers' entity caches expire on their own TTL, so there is nothing to invalidate from here
+        for tenant in [tenant_id] if tenant_id else await repos.tenant_ids():
+            await archive_tenant(repos.for_tenant(tenant), cutoff, batch_size)
+    finally:
+        repos.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a data migration or maintenance job")
+    subcommands = parser.add_subparsers(dest="migration", required=True)
+    backfill = subcommands.add_parser("backfill-tenant", help="assign documents without a tenant_id to one agency")
+    backfill.add_argument("--tenant-id", default=os.environ.get('DEFAULT_TENANT_ID', 'default'))
+    archiving = subcommands.add_parser("archive", help="move settled invoices and projects to the archive collections")
+    archiving.add_argument("--older-than-days", type=int, default=int(os.environ.get('ARCHIVE_AFTER_DAYS', '180')))
+    archiving.add_argument("--batch-size", type=int, default=int(os.environ.get('ARCHIVE_BATCH_SIZE', '500')))
+    archiving.add_argument("--tenant-id", help="only archive this agency")
+    args = parser.parse_args()
+
+    if args.migration == "backfill-tenant":
+        asyncio.run(backfill_tenant(args.tenant_id))
+    elif args.migration == "archive":
+        asyncio.run(archive(args.older_than_days, args.batch_size, args.tenant_id))
+
+
+if __name__ == "__main__":
+    main()
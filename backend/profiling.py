@@ -0,0 +1,212 @@
+import asyncio
+import functools
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Deque, Dict, List, Optional
+
+from fastapi.routing import APIRoute
+
+# Timings of the request being profiled, None when profiling is off
+current_timings: ContextVar[Optional["RequestTimings"]] = ContextVar("current_timings", default=None)
+
+
+class RequestTimings:
+    """Wall-clock time per phase of one request, in seconds."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Counter = Counter()
+        self.route_started: Optional[float] = None
+        self.endpoint_started: Optional[float] = None
+        self.endpoint_finished: Optional[float] = None
+        self.route_finished: Optional[float] = None
+
+    def breakdown(self) -> Dict[str, float]:
+        """Split the request into auth, db, validation, handler and serialization time.
+
+        Validation is everything FastAPI does between routing and calling the
+        endpoint (body parsing, Pydantic validation, dependencies) except auth;
+        serialization is the time from the endpoint returning to the response
+        being built. Handler time excludes the time spent waiting on storage.
+        """
+        total = time.perf_counter() - self.started
+        auth = self.phases["auth"]
+        db = self.phases["db"]
+        breakdown = {"auth": auth, "db": db}
+        if self.endpoint_started is not None and self.endpoint_finished is not None:
+            breakdown["validation"] = max(self.endpoint_started - self.route_started - auth, 0.0)
+            breakdown["handler"] = max(self.endpoint_finished - self.endpoint_started - db, 0.0)
+            breakdown["serialization"] = max(self.route_finished - self.endpoint_finished, 0.0)
+        breakdown["total"] = total
+        return breakdown
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.breakdown().items())
+
+
+@contextmanager
+def timed_phase(name: str):
+    timings = current_timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.phases[name] += time.perf_counter() - start
+
+
+class ProfiledRoute(APIRoute):
+    """APIRoute that records when the endpoint starts and stops for profiled requests."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        endpoint = self.dependant.call
+        if asyncio.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def timed_endpoint(*args, **kwargs):
+                timings = current_timings.get()
+                if timings is None:
+                    return await endpoint(*args, **kwargs)
+                timings.endpoint_started = time.perf_counter()
+                try:
+                    return await endpoint(*args, **kwargs)
+                finally:
+                    timings.endpoint_finished = time.perf_counter()
+
+            self.dependant.call = timed_endpoint
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            timings = current_timings.get()
+            if timings is None:
+                return await handler(request)
+            timings.route_started = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                timings.route_finished = time.perf_counter()
+
+        return timed_handler
+
+
+class TimedRepository:
+    """Proxy that adds the time spent in a repository's coroutine methods to the db phase.
+
+    Each method is wrapped once, on first use, and cached on the proxy; outside
+    a profiled request the wrapper only checks the context variable.
+    """
+
+    def __init__(self, repository):
+        self._repository = repository
+
+    def __getattr__(self, name):
+        attr = getattr(self._repository, name)
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def timed(*args, **kwargs):
+            if current_timings.get() is None:
+                return await attr(*args, **kwargs)
+            with timed_phase("db"):
+                return await attr(*args, **kwargs)
+
+        # Found on the instance from now on, so __getattr__ is not called again
+        setattr(self, name, timed)
+        return timed
+
+
+def instrument_repositories(repos, names) -> None:
+    for name in names:
+        setattr(repos, name, TimedRepository(getattr(repos, name)))
+
+
+# Sampling profiler
+class StackSampler:
+    """Samples the stack of one thread at a fixed interval from a helper thread.
+
+    The profiled thread pays nothing per call; the cost is one stack walk per
+    interval. Stacks are kept in the folded format (`a;b;c count`) that
+    flamegraph.pl, speedscope and inferno render directly. Because the event
+    loop thread is sampled, concurrent requests on the same worker show up in
+    each other's profiles, and time blocked on Mongo shows up as the selector.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.002):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{Path(code.co_filename).stem}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+class ProfileStore:
+    """Keeps the most recent profiles in memory and optionally writes them to a directory.
+
+    Each profile records the agency of the request so it can be shown to that agency's admins.
+    """
+
+    def __init__(self, max_profiles: int = 50, directory: Optional[str] = None):
+        self.profiles: Deque[dict] = deque(maxlen=max_profiles)
+        self.directory = Path(directory) if directory else None
+
+    def add(self, method: str, path: str, timings: RequestTimings, sampler: StackSampler, tenant_id: Optional[str] = None) -> str:
+        profile_id = str(uuid.uuid4())
+        folded = sampler.folded()
+        self.profiles.append({
+            "id": profile_id,
+            "tenant_id": tenant_id,
+            "method": method,
+            "path": path,
+            "timings": {name: round(seconds * 1000, 3) for name, seconds in timings.breakdown().items()},
+            "samples": sum(sampler.stacks.values()),
+            "folded": folded,
+        })
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            (self.directory / f"{profile_id}.folded").write_text(folded)
+        return profile_id
+
+    def _visible(self, tenant_id: Optional[str]) -> List[dict]:
+        # tenant_id None means every profile, including those of anonymous requests
+        return [profile for profile in self.profiles if tenant_id is None or profile['tenant_id'] == tenant_id]
+
+    def get(self, profile_id: str, tenant_id: Optional[str] = None) -> Optional[dict]:
+        for profile in self._visible(tenant_id):
+            if profile['id'] == profile_id:
+                return profile
+        return None
+
+    def summaries(self, tenant_id: Optional[str] = None) -> list:
+        return [{key: value for key, value in profile.items() if key != "folded"} for profile in reversed(self._visible(tenant_id))]
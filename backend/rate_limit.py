@@ -0,0 +1,107 @@
+import time
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from pymongo import ReturnDocument
+
+
+class BucketStore(ABC):
+    """Token-bucket state keyed by an arbitrary string."""
+
+    @abstractmethod
+    async def take(self, key: str, capacity: float, refill_per_second: float) -> Tuple[bool, float]:
+        """Take one token from `key`'s bucket.
+
+        Returns whether a token was available and, if not, how many seconds
+        until the next one is.
+        """
+
+    async def create_indexes(self) -> None:
+        pass
+
+
+class LocalBucketStore(BucketStore):
+    """Per-process buckets, least recently used evicted beyond `max_keys`.
+
+    Also the stand-in for the shared store in single-worker and memory mode.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key, capacity, refill_per_second):
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * refill_per_second)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / refill_per_second
+
+
+class MongoBucketStore(BucketStore):
+    """Buckets shared by all workers, refilled and taken in one atomic update."""
+
+    def __init__(self, collection, expire_after_seconds: int = 3600):
+        self.collection = collection
+        self.expire_after_seconds = expire_after_seconds
+
+    async def take(self, key, capacity, refill_per_second):
+        now = datetime.now(timezone.utc)
+        refilled = {"$min": [
+            capacity,
+            {"$add": [
+                {"$ifNull": ["$tokens", capacity]},
+                # Date subtraction yields milliseconds
+                {"$multiply": [{"$subtract": [now, {"$ifNull": ["$updated", now]}]}, refill_per_second / 1000]},
+            ]},
+        ]}
+        bucket = await self.collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "updated": now}},
+                {"$set": {
+                    "allowed": {"$gte": ["$tokens", 1]},
+                    "tokens": {"$cond": [{"$gte": ["$tokens", 1]}, {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if bucket['allowed']:
+            return True, 0.0
+        return False, (1 - bucket['tokens']) / refill_per_second
+
+    async def create_indexes(self):
+        # Idle buckets are full again long before they expire
+        await self.collection.create_index("updated", expireAfterSeconds=self.expire_after_seconds)
+
+
+class RateLimiter:
+    """Token buckets per IP address and per username, with rejection counters."""
+
+    def __init__(self, store: BucketStore, ip_burst: float, ip_per_minute: float, user_burst: float, user_per_minute: float):
+        self.store = store
+        self.limits = {
+            "ip": (ip_burst, ip_per_minute / 60),
+            "username": (user_burst, user_per_minute / 60),
+        }
+        self.counters: Counter = Counter()
+
+    async def admit(self, ip: Optional[str], username: Optional[str]) -> Tuple[bool, float]:
+        for kind, value in (("ip", ip), ("username", username)):
+            if not value:
+                continue
+            capacity, refill_per_second = self.limits[kind]
+            allowed, retry_after = await self.store.take(f"{kind}:{value}", capacity, refill_per_second)
+            if not allowed:
+                self.counters[f"rejected_{kind}"] += 1
+                return False, retry_after
+        self.counters["allowed"] += 1
+        return True, 0.0
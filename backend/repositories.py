@@ -0,0 +1,592 @@
+import copy
+import itertools
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReplaceOne
+
+# Every tenant-owned collection is partitioned by agency. Indexes lead with
+# tenant_id so a query only ever walks one agency's key range, and the same
+# prefix is the shard key.
+TENANT_COLLECTIONS = ["users", "clients", "projects", "invoices", "projects_archive", "invoices_archive", "activity", "invites"]
+SHARD_KEY = {"tenant_id": 1, "id": 1}
+
+# Multikey index backing the team workload queries
+TEAM_WORKLOAD_INDEX = [("tenant_id", 1), ("team_members", 1), ("status", 1)]
+
+# Secondary indexes per collection, shared by both backends
+INDEXES = {
+    # Login looks users up by username before the tenant is known
+    "users": [[("username", 1)], [("email", 1)]],
+    "clients": [],
+    "projects": [TEAM_WORKLOAD_INDEX, [("tenant_id", 1), ("status", 1), ("created_at", 1)], [("tenant_id", 1), ("client_id", 1)]],
+    # Invoice amounts are canonical server-computed totals, so revenue can be summed from the index
+    "invoices": [[("tenant_id", 1), ("status", 1), ("amount", 1)], [("tenant_id", 1), ("status", 1), ("created_at", 1)], [("tenant_id", 1), ("client_id", 1)]],
+    # Archived totals skip staged copies (`archiving`), and are counted and summed from these indexes
+    "projects_archive": [[("tenant_id", 1), ("archiving", 1)]],
+    "invoices_archive": [[("tenant_id", 1), ("archiving", 1), ("amount", 1)]],
+    "activity": [[("tenant_id", 1), ("at", -1)], [("tenant_id", 1), ("entity_type", 1), ("at", -1)]],
+    # Invites are only looked up and consumed on the (tenant_id, id) key
+    "invites": [],
+}
+
+Sort = Optional[Sequence[Tuple[str, int]]]
+
+
+# Repository interface
+class Repository(ABC):
+    """Storage for one entity collection, keyed by the document's `id` field.
+
+    Queries use the MongoDB filter dialect (equality, array membership and the
+    $in, $nin, $ne, $lt, $lte, $gt, $gte and $exists operators) so both
+    backends accept the same filters. Documents are returned without `_id`.
+    """
+
+    @abstractmethod
+    async def find_one(self, query: dict, projection: Optional[dict] = None) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def find(self, query: dict, projection: Optional[dict] = None, skip: int = 0, limit: int = 1000, sort: Sort = None) -> List[dict]:
+        ...
+
+    @abstractmethod
+    async def count(self, query: dict) -> int:
+        ...
+
+    @abstractmethod
+    async def distinct(self, field: str, query: dict) -> list:
+        ...
+
+    @abstractmethod
+    async def insert_one(self, doc: dict) -> None:
+        ...
+
+    @abstractmethod
+    async def insert_many(self, docs: List[dict]) -> None:
+        ...
+
+    @abstractmethod
+    async def upsert_many(self, docs: List[dict]) -> None:
+        ...
+
+    @abstractmethod
+    async def update_one(self, query: dict, values: dict) -> bool:
+        ...
+
+    @abstractmethod
+    async def update_many(self, query: dict, values: dict) -> int:
+        ...
+
+    @abstractmethod
+    async def delete_one(self, query: dict) -> bool:
+        ...
+
+    @abstractmethod
+    async def delete_many(self, query: dict) -> int:
+        ...
+
+    @abstractmethod
+    async def create_indexes(self) -> None:
+        ...
+
+
+class UserRepository(Repository):
+    pass
+
+
+class ClientRepository(Repository):
+    pass
+
+
+class ProjectRepository(Repository):
+    @abstractmethod
+    async def team_workload(self, match: dict) -> List[dict]:
+        """Active project count, project ids and budget total per team member of the projects matching `match`."""
+
+    @abstractmethod
+    async def member_projects(self, user_id: str, match: dict) -> List[dict]:
+        """`id` and `budget` of the active projects matching `match` that a team member is on."""
+
+
+class InvoiceRepository(Repository):
+    @abstractmethod
+    async def sum_amount(self, query: dict) -> float:
+        ...
+
+
+# Motor implementation
+def _without_id(projection: Optional[dict]) -> dict:
+    return {"_id": 0, **(projection or {})}
+
+
+class MotorRepository(Repository):
+    def __init__(self, collection, indexes: Iterable[list] = ()):
+        self.collection = collection
+        self.indexes = list(indexes)
+
+    async def find_one(self, query, projection=None):
+        return await self.collection.find_one(query, _without_id(projection))
+
+    async def find(self, query, projection=None, skip=0, limit=1000, sort=None):
+        cursor = self.collection.find(query, _without_id(projection))
+        if sort:
+            cursor = cursor.sort(list(sort))
+        return await cursor.skip(skip).limit(limit).to_list(limit)
+
+    async def count(self, query):
+        return await self.collection.count_documents(query)
+
+    async def distinct(self, field, query):
+        return await self.collection.distinct(field, query)
+
+    async def insert_one(self, doc):
+        # insert_one adds _id to the dict it is given, so hand it a copy
+        await self.collection.insert_one(dict(doc))
+
+    async def insert_many(self, docs):
+        if docs:
+            await self.collection.insert_many([dict(doc) for doc in docs], ordered=False)
+
+    async def upsert_many(self, docs):
+        # Upserts on a sharded collection must target the whole shard key, which is also the unique key
+        if docs:
+            await self.collection.bulk_write(
+                [ReplaceOne({"tenant_id": doc['tenant_id'], "id": doc['id']}, doc, upsert=True) for doc in docs],
+                ordered=False
+            )
+
+    async def update_one(self, query, values):
+        result = await self.collection.update_one(query, {"$set": values})
+        return result.matched_count > 0
+
+    async def update_many(self, query, values):
+        result = await self.collection.update_many(query, {"$set": values})
+        return result.modified_count
+
+    async def delete_one(self, query):
+        result = await self.collection.delete_one(query)
+        return result.deleted_count > 0
+
+    async def delete_many(self, query):
+        result = await self.collection.delete_many(query)
+        return result.deleted_count
+
+    async def create_indexes(self):
+        # Unique indexes on a sharded collection must be prefixed by the shard key
+        await self.collection.create_index(list(SHARD_KEY.items()), unique=True)
+        for keys in self.indexes:
+            await self.collection.create_index(keys)
+
+
+class MotorUserRepository(MotorRepository, UserRepository):
+    pass
+
+
+class MotorClientRepository(MotorRepository, ClientRepository):
+    pass
+
+
+class MotorProjectRepository(MotorRepository, ProjectRepository):
+    async def team_workload(self, match):
+        workload = await self.collection.aggregate([
+            {"$match": {**match, "status": "active"}},
+            {"$unwind": "$team_members"},
+            {"$group": {
+                "_id": "$team_members",
+                "active_projects": {"$sum": 1},
+                "project_ids": {"$push": "$id"},
+                "budget_total": {"$sum": {"$ifNull": ["$budget", 0]}},
+            }},
+            {"$sort": {"active_projects": -1, "_id": 1}},
+        ]).to_list(1000)
+        return [{"user_id": entry.pop('_id'), **entry} for entry in workload]
+
+    async def member_projects(self, user_id, match):
+        # Served by TEAM_WORKLOAD_INDEX
+        return await self.collection.find(
+            {**match, "team_members": user_id, "status": "active"},
+            {"_id": 0, "id": 1, "budget": 1}
+        ).to_list(1000)
+
+
+class MotorInvoiceRepository(MotorRepository, InvoiceRepository):
+    async def sum_amount(self, query):
+        result = await self.collection.aggregate([
+            {"$match": query},
+            {"$group": {"_id": None, "total": {"$sum": "$amount"}}},
+        ]).to_list(1)
+        return result[0]['total'] if result else 0
+
+
+# In-memory implementation
+def _compare(op: str, value, arg) -> bool:
+    if value is None or arg is None:
+        return False
+    try:
+        if op == "$lt":
+            return value < arg
+        if op == "$lte":
+            return value <= arg
+        if op == "$gt":
+            return value > arg
+        return value >= arg
+    except TypeError:
+        return False
+
+
+def _match_value(value, cond) -> bool:
+    values = value if isinstance(value, list) else [value]
+
+    if isinstance(cond, dict) and cond and all(key.startswith("$") for key in cond):
+        for op, arg in cond.items():
+            if op == "$in":
+                if not any(v in arg for v in values):
+                    return False
+            elif op == "$nin":
+                if any(v in arg for v in values):
+                    return False
+            elif op == "$ne":
+                if any(v == arg for v in values):
+                    return False
+            elif op == "$exists":
+                if (value is not None) != bool(arg):
+                    return False
+            elif op in ("$lt", "$lte", "$gt", "$gte"):
+                if not any(_compare(op, v, arg) for v in values):
+                    return False
+            else:
+                raise ValueError(f"Unsupported query operator {op}")
+        return True
+
+    # Like MongoDB, a scalar condition matches an array that contains it
+    return value == cond or cond in values
+
+
+def matches(doc: dict, query: dict) -> bool:
+    return all(_match_value(doc.get(key), cond) for key, cond in query.items())
+
+
+def project(doc: dict, projection: Optional[dict]) -> dict:
+    fields = {key: flag for key, flag in (projection or {}).items() if key != "_id"}
+    if not fields:
+        return copy.deepcopy(doc)
+    if any(fields.values()):
+        return {key: copy.deepcopy(doc[key]) for key, flag in fields.items() if flag and key in doc}
+    return {key: copy.deepcopy(value) for key, value in doc.items() if key not in fields}
+
+
+class MemoryRepository(Repository):
+    """Dict-backed collection with a hash index on every field of the declared indexes.
+
+    Equality and $in filters on `id` or an indexed field only visit the
+    documents in the smallest matching index bucket; any other filter falls
+    back to a full scan.
+    """
+
+    def __init__(self, indexes: Iterable[list] = ()):
+        self._docs: Dict[str, dict] = {}
+        self._order: Dict[str, int] = {}
+        self._sequence = itertools.count()
+        self._indexed_fields = {field for keys in indexes for field, _ in keys} - {"id"}
+        self._indexes: Dict[str, Dict[object, set]] = {field: defaultdict(set) for field in self._indexed_fields}
+
+    def _index_keys(self, doc: dict, field: str) -> list:
+        value = doc.get(field)
+        keys = value if isinstance(value, list) else [value]
+        return [key for key in keys if isinstance(key, (str, int, float, bool, type(None)))]
+
+    def _add(self, doc: dict) -> None:
+        doc_id = doc['id']
+        if doc_id in self._docs:
+            self._remove(doc_id)
+        self._docs[doc_id] = doc
+        self._order[doc_id] = next(self._sequence)
+        for field, index in self._indexes.items():
+            for key in self._index_keys(doc, field):
+                index[key].add(doc_id)
+
+    def _remove(self, doc_id: str) -> None:
+        doc = self._docs.pop(doc_id)
+        self._order.pop(doc_id)
+        for field, index in self._indexes.items():
+            for key in self._index_keys(doc, field):
+                index[key].discard(doc_id)
+                if not index[key]:
+                    del index[key]
+
+    def _candidates(self, query: dict) -> Iterable[str]:
+        best = None
+        for field, cond in query.items():
+            if field != "id" and field not in self._indexed_fields:
+                continue
+            if isinstance(cond, dict):
+                if set(cond) != {"$in"}:
+                    continue
+                keys = cond["$in"]
+            else:
+                keys = [cond]
+            if field == "id":
+                ids = {key for key in keys if key in self._docs}
+            else:
+                ids = set().union(*(self._indexes[field].get(key, ()) for key in keys))
+            if best is None or len(ids) < len(best):
+                best = ids
+        if best is None:
+            return list(self._docs)
+        return sorted(best, key=self._order.__getitem__)
+
+    def _select(self, query: dict) -> List[dict]:
+        return [self._docs[doc_id] for doc_id in self._candidates(query) if matches(self._docs[doc_id], query)]
+
+    async def find_one(self, query, projection=None):
+        for doc in self._select(query):
+            return project(doc, projection)
+        return None
+
+    async def find(self, query, projection=None, skip=0, limit=1000, sort=None):
+        docs = self._select(query)
+        for field, direction in reversed(list(sort or [])):
+            docs.sort(key=lambda doc: (doc.get(field) is not None, doc.get(field)), reverse=direction < 0)
+        return [project(doc, projection) for doc in docs[skip:skip + limit]]
+
+    async def count(self, query):
+        return len(self._select(query))
+
+    async def distinct(self, field, query):
+        values = []
+        for doc in self._select(query):
+            value = doc.get(field)
+            for key in value if isinstance(value, list) else [value]:
+                if key is not None and key not in values:
+                    values.append(key)
+        return values
+
+    async def insert_one(self, doc):
+        if doc['id'] in self._docs:
+            raise ValueError(f"Duplicate id {doc['id']}")
+        self._add(copy.deepcopy(doc))
+
+    async def insert_many(self, docs):
+        for doc in docs:
+            await self.insert_one(doc)
+
+    async def upsert_many(self, docs):
+        for doc in docs:
+            self._add(copy.deepcopy(doc))
+
+    async def update_one(self, query, values):
+        docs = self._select(query)
+        if not docs:
+            return False
+        self._add({**docs[0], **copy.deepcopy(values)})
+        return True
+
+    async def update_many(self, query, values):
+        docs = self._select(query)
+        for doc in docs:
+            self._add({**doc, **copy.deepcopy(values)})
+        return len(docs)
+
+    async def delete_one(self, query):
+        docs = self._select(query)
+        if not docs:
+            return False
+        self._remove(docs[0]['id'])
+        return True
+
+    async def delete_many(self, query):
+        docs = self._select(query)
+        for doc in docs:
+            self._remove(doc['id'])
+        return len(docs)
+
+    async def create_indexes(self):
+        pass
+
+
+class MemoryUserRepository(MemoryRepository, UserRepository):
+    pass
+
+
+class MemoryClientRepository(MemoryRepository, ClientRepository):
+    pass
+
+
+class MemoryProjectRepository(MemoryRepository, ProjectRepository):
+    async def team_workload(self, match):
+        workload: Dict[str, dict] = {}
+        for project in self._select({**match, "status": "active"}):
+            for user_id in project.get('team_members') or []:
+                entry = workload.setdefault(user_id, {"user_id": user_id, "active_projects": 0, "project_ids": [], "budget_total": 0})
+                entry['active_projects'] += 1
+                entry['project_ids'].append(project['id'])
+                entry['budget_total'] += project.get('budget') or 0
+        return sorted(workload.values(), key=lambda entry: (-entry['active_projects'], entry['user_id']))
+
+    async def member_projects(self, user_id, match):
+        return await self.find({**match, "team_members": user_id, "status": "active"}, {"id": 1, "budget": 1})
+
+
+class MemoryInvoiceRepository(MemoryRepository, InvoiceRepository):
+    async def sum_amount(self, query):
+        return sum(doc.get('amount') or 0 for doc in self._select(query))
+
+
+# Tenant scoping
+class TenantRepository:
+    """View of a repository restricted to one tenant.
+
+    Every filter gets the tenant_id added and every written document is
+    stamped with it, so handlers cannot read or write another agency's data.
+    """
+
+    def __init__(self, repository: Repository, tenant_id: str):
+        self.repository = repository
+        self.tenant_id = tenant_id
+
+    def _scope(self, query: dict) -> dict:
+        return {**query, "tenant_id": self.tenant_id}
+
+    def _stamp(self, doc: dict) -> dict:
+        return {**doc, "tenant_id": self.tenant_id}
+
+    async def find_one(self, query, projection=None):
+        return await self.repository.find_one(self._scope(query), projection)
+
+    async def find(self, query, projection=None, skip=0, limit=1000, sort=None):
+        return await self.repository.find(self._scope(query), projection, skip=skip, limit=limit, sort=sort)
+
+    async def count(self, query):
+        return await self.repository.count(self._scope(query))
+
+    async def insert_one(self, doc):
+        await self.repository.insert_one(self._stamp(doc))
+
+    async def insert_many(self, docs):
+        await self.repository.insert_many([self._stamp(doc) for doc in docs])
+
+    async def upsert_many(self, docs):
+        await self.repository.upsert_many([self._stamp(doc) for doc in docs])
+
+    async def update_one(self, query, values):
+        return await self.repository.update_one(self._scope(query), values)
+
+    async def update_many(self, query, values):
+        return await self.repository.update_many(self._scope(query), values)
+
+    async def delete_one(self, query):
+        return await self.repository.delete_one(self._scope(query))
+
+    async def delete_many(self, query):
+        return await self.repository.delete_many(self._scope(query))
+
+    async def team_workload(self):
+        return await self.repository.team_workload({"tenant_id": self.tenant_id})
+
+    async def member_projects(self, user_id):
+        return await self.repository.member_projects(user_id, {"tenant_id": self.tenant_id})
+
+    async def sum_amount(self, query):
+        return await self.repository.sum_amount(self._scope(query))
+
+
+# Wiring
+class Repositories:
+    def __init__(self, users, clients, projects, invoices, projects_archive, invoices_archive, activity, invites, mongo_client=None):
+        self.users: UserRepository = users
+        self.clients: ClientRepository = clients
+        self.projects: ProjectRepository = projects
+        self.invoices: InvoiceRepository = invoices
+        self.projects_archive: ProjectRepository = projects_archive
+        self.invoices_archive: InvoiceRepository = invoices_archive
+        self.activity: Repository = activity
+        self.invites: Repository = invites
+        self.mongo_client = mongo_client
+
+    def collection(self, name: str) -> Repository:
+        return getattr(self, name)
+
+    def for_tenant(self, tenant_id: str) -> "TenantRepositories":
+        return TenantRepositories(self, tenant_id)
+
+    async def create_indexes(self) -> None:
+        for name in INDEXES:
+            await self.collection(name).create_indexes()
+
+    async def tenant_ids(self) -> List[str]:
+        # Every agency is created together with its first admin
+        return await self.users.distinct("tenant_id", {})
+
+    async def backfill_tenant(self, tenant_id: str) -> Dict[str, int]:
+        """Assign documents written before multi-tenancy to `tenant_id`.
+
+        Scans every tenant-owned collection, so it runs as a one-off migration (migrate.py).
+        """
+        backfilled = {}
+        for name in TENANT_COLLECTIONS:
+            backfilled[name] = await self.collection(name).update_many({"tenant_id": {"$exists": False}}, {"tenant_id": tenant_id})
+        return backfilled
+
+    async def shard_collections(self) -> None:
+        """Shard the tenant-owned collections on SHARD_KEY (Mongo only, needs a mongos)."""
+        if self.mongo_client is None:
+            return
+        db_name = self.users.collection.database.name
+        await self.mongo_client.admin.command("enableSharding", db_name)
+        # Users stay unsharded: login resolves the tenant from the username
+        for name in TENANT_COLLECTIONS:
+            if name != "users":
+                await self.mongo_client.admin.command("shardCollection", f"{db_name}.{name}", key=SHARD_KEY)
+
+    async def ping(self) -> None:
+        """Round-trip to the server so the connection pool is open before traffic arrives."""
+        if self.mongo_client is not None:
+            await self.mongo_client.admin.command("ping")
+
+    def close(self) -> None:
+        if self.mongo_client is not None:
+            self.mongo_client.close()
+
+
+class TenantRepositories:
+    """The repositories of one tenant, with the same attribute names as `Repositories`."""
+
+    def __init__(self, repos: Repositories, tenant_id: str):
+        self.tenant_id = tenant_id
+        for name in TENANT_COLLECTIONS:
+            setattr(self, name, TenantRepository(repos.collection(name), tenant_id))
+
+    def collection(self, name: str) -> TenantRepository:
+        return getattr(self, name)
+
+
+def create_motor_repositories(mongo_url: str, db_name: str, min_pool_size: int = 0) -> Repositories:
+    client = AsyncIOMotorClient(mongo_url, minPoolSize=min_pool_size)
+    db = client[db_name]
+    return Repositories(
+        users=MotorUserRepository(db.users, INDEXES["users"]),
+        clients=MotorClientRepository(db.clients, INDEXES["clients"]),
+        projects=MotorProjectRepository(db.projects, INDEXES["projects"]),
+        invoices=MotorInvoiceRepository(db.invoices, INDEXES["invoices"]),
+        projects_archive=MotorProjectRepository(db.projects_archive, INDEXES["projects_archive"]),
+        invoices_archive=MotorInvoiceRepository(db.invoices_archive, INDEXES["invoices_archive"]),
+        activity=MotorRepository(db.activity, INDEXES["activity"]),
+        invites=MotorRepository(db.invites, INDEXES["invites"]),
+        mongo_client=client,
+    )
+
+
+def create_memory_repositories() -> Repositories:
+    return Repositories(
+        users=MemoryUserRepository(INDEXES["users"]),
+        clients=MemoryClientRepository(INDEXES["clients"]),
+        projects=MemoryProjectRepository(INDEXES["projects"]),
+        invoices=MemoryInvoiceRepository(INDEXES["invoices"]),
+        projects_archive=MemoryProjectRepository(INDEXES["projects_archive"]),
+        invoices_archive=MemoryInvoiceRepository(INDEXES["invoices_archive"]),
+        activity=MemoryRepository(INDEXES["activity"]),
+        invites=MemoryRepository(INDEXES["invites"]),
+    )
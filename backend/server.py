@@ -1,45 +1,138 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, status
+from fastapi.responses import PlainTextResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import ipaddress
 import logging
+import random
+import threading
+import time
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, model_validator
+from typing import Dict, List, Optional
 import uuid
 from datetime import datetime, timezone, timedelta
+from decimal import Decimal, ROUND_HALF_UP
 import bcrypt
 import jwt
+import numpy as np
+from repositories import TenantRepositories, create_memory_repositories, create_motor_repositories
+from rate_limit import LocalBucketStore, MongoBucketStore, RateLimiter
+from cache import LRUCache
+from activity import ActivityLog
+from archive import SETTLED, archive_tenant
+from profiling import (
+    ProfiledRoute, ProfileStore, RequestTimings, StackSampler,
+    current_timings, instrument_repositories, timed_phase,
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Worker lifecycle timings, reported by /api/health and the launcher
+process_started = time.perf_counter()
+worker_stats = {"pid": os.getpid(), "ready": False, "startup_ms": None, "warmup_ms": None, "cold_request_ms": None}
+
+# Storage backend: "mongo" (default) or "memory" for tests and benchmarks
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'mongo')
+if STORAGE_BACKEND == "memory":
+    repos = create_memory_repositories()
+else:
+    repos = create_motor_repositories(
+        os.environ['MONGO_URL'],
+        os.environ['DB_NAME'],
+        min_pool_size=int(os.environ.get('MONGO_MIN_POOL_SIZE', '0'))
+    )
+instrument_repositories(repos, ["users", "clients", "projects", "invoices", "projects_archive", "invoices_archive", "activity", "invites"])
+
+# Activity Log Configuration
+activity_log = ActivityLog(
+    repos.activity,
+    batch_size=int(os.environ.get('ACTIVITY_BATCH_SIZE', '100')),
+    flush_interval=float(os.environ.get('ACTIVITY_FLUSH_SECONDS', '1')),
+    max_queued=int(os.environ.get('ACTIVITY_MAX_QUEUED', '10000'))
+)
+
+# Profiling Configuration
+# Admins can profile a single request with an `X-Profile: 1` header and get Server-Timing back;
+# a sample rate above 0 also profiles that share of all requests, kept only under /api/admin/profiles
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+profile_store = ProfileStore(
+    max_profiles=int(os.environ.get('PROFILE_MAX_STORED', '50')),
+    directory=os.environ.get('PROFILE_DIR')
+)
+
+# Archival Configuration
+# Paid invoices and completed projects older than this move to the *_archive collections
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '180'))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '500'))
+
+# Auth Rate Limiting
+# Buckets for /auth/login and /auth/register; "mongo" shares them across workers
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'local')
+if RATE_LIMIT_BACKEND == "mongo" and repos.mongo_client is not None:
+    bucket_store = MongoBucketStore(repos.mongo_client[os.environ['DB_NAME']].rate_limit_buckets)
+else:
+    bucket_store = LocalBucketStore()
+auth_rate_limiter = RateLimiter(
+    bucket_store,
+    ip_burst=float(os.environ.get('AUTH_IP_BURST', '20')),
+    ip_per_minute=float(os.environ.get('AUTH_IP_PER_MINUTE', '20')),
+    user_burst=float(os.environ.get('AUTH_USER_BURST', '5')),
+    user_per_minute=float(os.environ.get('AUTH_USER_PER_MINUTE', '5')),
+)
+
+# Addresses or CIDR ranges (comma-separated) of the ingress and load balancers in front of the API.
+# The per-IP buckets key on the nearest X-Forwarded-For hop that is not one of them; left empty,
+# the peer address is used, which behind a proxy puts every client in the proxy's bucket.
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(value.strip(), strict=False)
+    for value in os.environ.get('TRUSTED_PROXIES', '').split(',') if value.strip()
+]
+
+# Batch Lookup Configuration
+MAX_BATCH_GET_IDS = int(os.environ.get('MAX_BATCH_GET_IDS', '200'))
+entity_caches = {
+    name: LRUCache(
+        max_entries=int(os.environ.get('ENTITY_CACHE_SIZE', '1024')),
+        ttl=float(os.environ.get('ENTITY_CACHE_TTL_SECONDS', '30'))
+    )
+    for name in ("users", "clients", "projects")
+}
 
 # JWT Configuration
 SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
+INVITE_EXPIRE_DAYS = int(os.environ.get('INVITE_EXPIRE_DAYS', '7'))
+ROLES = ("admin", "team_member")
+
+# Tenant Configuration
+# Data and tokens from before multi-tenancy belong to this agency
+DEFAULT_TENANT_ID = os.environ.get('DEFAULT_TENANT_ID', 'default')
+SHARD_COLLECTIONS = os.environ.get('SHARD_COLLECTIONS', 'false').lower() == "true"
+# Usernames (comma-separated) of the operators allowed to see process-wide admin data
+# such as rate-limit counters and every agency's profiles; agency admins only see their own
+PLATFORM_ADMINS = {name.strip() for name in os.environ.get('PLATFORM_ADMINS', '').split(',') if name.strip()}
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 # Create the main app
 app = FastAPI()
 
 # Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", route_class=ProfiledRoute)
 
 # Models
 class UserCreate(BaseModel):
     username: str
     email: EmailStr
     password: str
-    role: str = "team_member"  # admin or team_member
+    role: str = "team_member"  # admin or team_member, only honoured when an admin registers the user
+    invite_code: Optional[str] = None  # joins the agency that issued it
 
 class UserLogin(BaseModel):
     username: str
@@ -48,6 +141,7 @@ class UserLogin(BaseModel):
 class User(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    tenant_id: str
     username: str
     email: EmailStr
     role: str
@@ -58,6 +152,28 @@ class UserResponse(BaseModel):
     username: str
     email: str
     role: str
+    tenant_id: str = DEFAULT_TENANT_ID
+
+class ActivityEntry(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    actor_id: Optional[str] = None
+    actor: Optional[str] = None
+    action: str  # created, updated, deleted
+    entity_type: str  # client, project, invoice
+    entity_id: str
+    at: datetime
+
+class InviteCreate(BaseModel):
+    role: str = "team_member"
+
+class InviteResponse(BaseModel):
+    invite_code: str
+    role: str
+    expires_at: datetime
+
+class BatchGetRequest(BaseModel):
+    ids: List[str]
 
 class TokenResponse(BaseModel):
     access_token: str
@@ -106,16 +222,23 @@ class Project(BaseModel):
     team_members: List[str] = []
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class TeamWorkload(BaseModel):
+    user_id: str
+    active_projects: int
+    project_ids: List[str] = []
+    budget_total: float = 0.0
+
 class InvoiceItem(BaseModel):
     description: str
     quantity: int
     rate: float
-    amount: float
+    amount: Optional[float] = None  # computed server-side as quantity * rate
 
 class InvoiceCreate(BaseModel):
     client_id: str
     project_id: Optional[str] = None
-    amount: float
+    amount: Optional[float] = None  # computed server-side when items are given
+    tax_rate: float = 0.0  # percentage, e.g. 18 for 18%
     status: str = "pending"  # pending, paid, overdue
     due_date: str
     items: List[InvoiceItem] = []
@@ -128,12 +251,26 @@ class Invoice(BaseModel):
     client_id: str
     project_id: Optional[str] = None
     amount: float
+    subtotal: float
+    tax_rate: float = 0.0
+    tax: float = 0.0
+    total: float
     status: str = "pending"
     due_date: str
     items: List[InvoiceItem] = []
     notes: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+    @model_validator(mode="before")
+    @classmethod
+    def fill_legacy_totals(cls, data):
+        # Invoices stored before totals were computed only have `amount`, which was their untaxed total
+        if isinstance(data, dict) and "amount" in data:
+            data = {**data}
+            data.setdefault('subtotal', data['amount'])
+            data.setdefault('total', data['amount'])
+        return data
+
 # Helper Functions
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -143,14 +280,62 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    with timed_phase("auth"):
+        try:
+            token = credentials.credentials
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            if payload.get('type') == "invite":
+                raise HTTPException(status_code=401, detail="Invalid token")
+            payload.setdefault('tenant_id', DEFAULT_TENANT_ID)
+            return payload
+        except jwt.ExpiredSignatureError:
+            raise HTTPException(status_code=401, detail="Token has expired")
+        except jwt.InvalidTokenError:
+            raise HTTPException(status_code=401, detail="Invalid token")
+
+async def create_invite(tenant_id: str, role: str, invited_by: str) -> tuple:
+    # Signed like access tokens; the stored record only tracks whether the code has been used
+    invite_id = str(uuid.uuid4())
+    expires_at = datetime.now(timezone.utc) + timedelta(days=INVITE_EXPIRE_DAYS)
+    await repos.for_tenant(tenant_id).invites.insert_one({
+        "id": invite_id, "role": role, "invited_by": invited_by,
+        "expires_at": expires_at.isoformat(), "used_by": None
+    })
+    payload = {"type": "invite", "jti": invite_id, "tenant_id": tenant_id, "role": role, "invited_by": invited_by, "exp": expires_at}
+    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM), expires_at
+
+def read_invite(invite_code: str) -> dict:
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token has expired")
+        payload = jwt.decode(invite_code, SECRET_KEY, algorithms=[ALGORITHM])
     except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+        payload = {}
+    if payload.get('type') != "invite" or not payload.get('jti'):
+        raise HTTPException(status_code=400, detail="Invalid or expired invite code")
+    return payload
+
+async def use_invite(invite: dict, user_id: str) -> None:
+    # The filter on used_by makes this a compare-and-set, so two sign-ups cannot share a code
+    used = await repos.for_tenant(invite['tenant_id']).invites.update_one(
+        {"id": invite['jti'], "used_by": None},
+        {"used_by": user_id, "used_at": datetime.now(timezone.utc).isoformat()}
+    )
+    if not used:
+        raise HTTPException(status_code=400, detail="Invite code has already been used")
+
+def get_tenant_repos(token_data: dict = Depends(verify_token)) -> TenantRepositories:
+    # Every data route goes through this view, so queries are always scoped to the caller's agency
+    return repos.for_tenant(token_data['tenant_id'])
+
+async def require_admin(token_data: dict = Depends(verify_token)):
+    user_doc = await repos.users.find_one({"id": token_data['id']}, {"role": 1, "username": 1})
+    if not user_doc or user_doc.get('role') != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return {**token_data, "platform_admin": user_doc['username'] in PLATFORM_ADMINS}
+
+async def require_platform_admin(token_data: dict = Depends(require_admin)):
+    if not token_data['platform_admin']:
+        raise HTTPException(status_code=403, detail="Platform admin access required")
+    return token_data
 
 def hash_password(password: str) -> str:
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
@@ -158,16 +343,276 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
+def is_trusted_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXIES)
+
+def client_ip(request: Request) -> Optional[str]:
+    """Address of the client, looking through the trusted proxies in front of the API."""
+    address = request.client.host if request.client else None
+    if address is None or not is_trusted_proxy(address):
+        return address
+    # Each proxy appends the address it got the request from, so walk back past our own
+    hops = [hop.strip() for hop in request.headers.get("X-Forwarded-For", "").split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not is_trusted_proxy(hop):
+            return hop
+        address = hop
+    return address
+
+async def admit_auth_attempt(request: Request, username: str):
+    # Runs before any DB lookup or bcrypt work so a burst cannot tie up the worker
+    allowed, retry_after = await auth_rate_limiter.admit(client_ip(request), username)
+    if not allowed:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many attempts, please try again later",
+            headers={"Retry-After": str(max(1, round(retry_after)))}
+        )
+
+# Invoice Totals
+CENT = Decimal("0.01")
+RATE_DECIMALS = 6  # rates and tax rates are checked exactly in integer millionths up to this many places
+MAX_BULK_INVOICES = 5000
+
+def to_money(value) -> Decimal:
+    # Go through str() so floats like 0.1 keep their decimal spelling
+    return Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+def line_amount(item: InvoiceItem) -> Decimal:
+    return to_money(Decimal(item.quantity) * Decimal(str(item.rate)))
+
+def tax_amount(subtotal: Decimal, tax_rate: float) -> Decimal:
+    return to_money(subtotal * Decimal(str(tax_rate)) / Decimal(100))
+
+def compute_invoice_totals(invoice_input: InvoiceCreate) -> dict:
+    """Compute line amounts, subtotal, tax and total with exact Decimal rounding.
+
+    Invoices without line items keep the flat amount that was sent.
+    """
+    if invoice_input.items:
+        items = []
+        subtotal = Decimal("0")
+        for item in invoice_input.items:
+            amount = line_amount(item)
+            subtotal += amount
+            items.append({**item.model_dump(), "amount": float(amount)})
+    else:
+        if invoice_input.amount is None:
+            raise HTTPException(status_code=422, detail="Invoice needs either items or an amount")
+        items = []
+        subtotal = to_money(invoice_input.amount)
+
+    tax = tax_amount(subtotal, invoice_input.tax_rate)
+    total = subtotal + tax
+
+    return {
+        "items": items,
+        "subtotal": float(subtotal),
+        "tax_rate": invoice_input.tax_rate,
+        "tax": float(tax),
+        "total": float(total),
+        "amount": float(total),
+    }
+
+def invoice_mismatch(invoice_input: InvoiceCreate) -> bool:
+    """Exact Decimal version of the batch check, for one invoice."""
+    if not invoice_input.items:
+        return invoice_input.amount is None
+    subtotal = Decimal("0")
+    for item in invoice_input.items:
+        amount = line_amount(item)
+        if item.amount is not None and to_money(item.amount) != amount:
+            return True
+        subtotal += amount
+    total = subtotal + tax_amount(subtotal, invoice_input.tax_rate)
+    return invoice_input.amount is not None and to_money(invoice_input.amount) != total
+
+# Largest magnitude the batch check keeps in int64; float64 sums of such values stay exact
+SAFE_UNITS = 2 ** 53
+# Products of two int64 operands are only formed below this, so they cannot wrap around
+SAFE_PRODUCT = 2.0 ** 62
+
+def to_millionths(values) -> tuple:
+    """Scale numbers to int64 millionths through their decimal spelling, like `to_money`.
+
+    Also returns a mask of the values that fit: at most RATE_DECIMALS places and
+    no larger than SAFE_UNITS millionths. Values that do not fit come back as 0.
+    """
+    scaled = [Decimal(str(value)).scaleb(RATE_DECIMALS) for value in values]
+    fits = np.fromiter(
+        (value.is_finite() and value == value.to_integral_value() and abs(value) <= SAFE_UNITS for value in scaled),
+        dtype=bool, count=len(scaled)
+    )
+    units = np.fromiter((int(value) if fit else 0 for value, fit in zip(scaled, fits)), dtype=np.int64, count=len(scaled))
+    return units, fits
+
+def divide_half_up(numerator: np.ndarray, divisor: int) -> np.ndarray:
+    # Integer division rounding halves away from zero, as ROUND_HALF_UP does
+    return np.sign(numerator) * ((np.abs(numerator) + divisor // 2) // divisor)
+
+def validate_invoice_batch(invoices: List[InvoiceCreate]) -> List[int]:
+    """Check client-sent amounts for a batch of invoices in one vectorized pass.
+
+    Every line item of every invoice is flattened into NumPy arrays so that
+    quantity * rate and the per-invoice sums are computed at once, in integer
+    cents with the same half-up rounding as `compute_invoice_totals`. Invoices
+    with a value that does not fit that arithmetic (more than RATE_DECIMALS
+    places, or large enough to overflow int64) are checked with
+    `invoice_mismatch` instead. Returns the indices of invoices whose sent line
+    amounts or invoice amount disagree with the computed values. Amounts that
+    were not sent are not checked.
+    """
+    if not invoices:
+        return []
+
+    item_counts = np.fromiter((len(inv.items) for inv in invoices), dtype=np.int64, count=len(invoices))
+    owners = np.repeat(np.arange(len(invoices)), item_counts)
+    items = [item for inv in invoices for item in inv.items]
+    to_cents = 10 ** (RATE_DECIMALS - 2)
+
+    quantity_fits = np.fromiter((abs(item.quantity) <= SAFE_UNITS for item in items), dtype=bool, count=len(items))
+    quantity = np.fromiter(
+        (item.quantity if fit else 0 for item, fit in zip(items, quantity_fits)), dtype=np.int64, count=len(items)
+    )
+    rate, rate_fits = to_millionths(item.rate for item in items)
+    sent_line, sent_line_fits = to_millionths(item.amount or 0 for item in items)
+    item_fits = quantity_fits & rate_fits & sent_line_fits
+    item_fits &= np.abs(quantity.astype(np.float64)) * np.abs(rate.astype(np.float64)) < SAFE_PRODUCT
+    quantity, rate = np.where(item_fits, quantity, 0), np.where(item_fits, rate, 0)
+    exact = np.bincount(owners, weights=~item_fits, minlength=len(invoices)) == 0
+
+    line = divide_half_up(quantity * rate, to_cents)
+    has_sent_line = np.fromiter((item.amount is not None for item in items), dtype=bool, count=len(items))
+    bad_line = has_sent_line & (divide_half_up(sent_line, to_cents) != line)
+    invalid = np.bincount(owners, weights=bad_line, minlength=len(invoices)) > 0
+
+    subtotal = np.bincount(owners, weights=line, minlength=len(invoices))
+    tax_rate, tax_fits = to_millionths(inv.tax_rate for inv in invoices)
+    exact &= tax_fits & (np.abs(subtotal) <= SAFE_UNITS) & (np.abs(subtotal) * np.abs(tax_rate) < SAFE_PRODUCT)
+    subtotal = np.where(exact, np.rint(subtotal), 0).astype(np.int64)
+    # cents * percent in millionths / 100 / 10**6
+    tax = divide_half_up(subtotal * np.where(exact, tax_rate, 0), 10 ** (RATE_DECIMALS + 2))
+    total = subtotal + tax
+
+    flat, flat_fits = to_millionths(inv.amount or 0 for inv in invoices)
+    has_flat = np.fromiter((inv.amount is not None for inv in invoices), dtype=bool, count=len(invoices))
+    has_items = item_counts > 0
+    exact &= flat_fits | ~has_items
+
+    # Only itemised invoices have a computed total to compare the sent amount against; the
+    # server's total is the sum of the rounded lines plus tax, so the sent one must match it exactly
+    bad_total = has_items & has_flat & (divide_half_up(flat, to_cents) != total)
+    missing_amount = ~has_items & ~has_flat
+    invalid = (invalid | bad_total | missing_amount) & exact
+
+    for index in np.flatnonzero(~exact):
+        invalid[index] = invoice_mismatch(invoices[index])
+
+    return np.flatnonzero(invalid).tolist()
+
+# Archival
+async def find_with_archive(tenant_repos: TenantRepositories, name: str, query: dict, include_archived: bool) -> List[dict]:
+    docs = await tenant_repos.collection(name).find(query)
+    if include_archived:
+        # Settled copies never share an id with a hot document, but should one slip through the hot one wins
+        seen = {doc['id'] for doc in docs}
+        archived = await tenant_repos.collection(f"{name}_archive").find({**query, **SETTLED})
+        docs += [doc for doc in archived if doc['id'] not in seen]
+    return docs
+
+async def find_one_with_archive(tenant_repos: TenantRepositories, name: str, query: dict, include_archived: bool) -> Optional[dict]:
+    doc = await tenant_repos.collection(name).find_one(query)
+    if doc is None and include_archived:
+        doc = await tenant_repos.collection(f"{name}_archive").find_one({**query, **SETTLED})
+    return doc
+
+async def count_issued_invoices(tenant_repos: TenantRepositories) -> int:
+    # Archived invoices still hold their numbers, so count them too; numbering is per agency
+    return await tenant_repos.invoices.count({}) + await tenant_repos.invoices_archive.count(SETTLED)
+
+async def batch_get(tenant_repos: TenantRepositories, name: str, ids: List[str], projection: Optional[dict] = None) -> Dict[str, dict]:
+    """Resolve ids to documents through the entity cache and one `$in` query for the misses.
+
+    Ids that do not exist are left out of the result.
+    """
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > MAX_BATCH_GET_IDS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_GET_IDS} ids per request")
+    
+    cache = entity_caches[name]
+    found, missing = cache.get_many(tenant_repos.tenant_id, ids)
+    if missing:
+        docs = await tenant_repos.collection(name).find({"id": {"$in": missing}}, projection, limit=len(missing))
+        for doc in docs:
+            if isinstance(doc.get('created_at'), str):
+                doc['created_at'] = datetime.fromisoformat(doc['created_at'])
+        cache.put_many(tenant_repos.tenant_id, docs)
+        found.update((doc['id'], doc) for doc in docs)
+    
+    return {entity_id: found[entity_id] for entity_id in ids if entity_id in found}
+
+def warm_up_models():
+    """Run each request and response model once so the first real request does not pay for it."""
+    now = datetime.now(timezone.utc)
+    UserCreate(username="warmup", email="warmup@example.com", password="warmup")
+    UserLogin(username="warmup", password="warmup")
+    client = Client(**ClientCreate(name="warmup", email="warmup@example.com").model_dump())
+    project = Project(**ProjectCreate(name="warmup", client_id=client.id, team_members=["warmup"]).model_dump())
+    invoice_input = InvoiceCreate(
+        client_id=client.id,
+        due_date="2024-01-01",
+        items=[InvoiceItem(description="warmup", quantity=1, rate=1.0)]
+    )
+    invoice = Invoice(invoice_number="INV-00000", **{**invoice_input.model_dump(), **compute_invoice_totals(invoice_input)})
+    validate_invoice_batch([invoice_input])
+    user = UserResponse(id="warmup", username="warmup", email="warmup@example.com", role="admin")
+    responses = [
+        client, project, invoice, user,
+        TokenResponse(access_token="warmup", token_type="bearer", user=user),
+        TeamWorkload(user_id="warmup", active_projects=0),
+        InviteResponse(invite_code="warmup", role="team_member", expires_at=now),
+        ActivityEntry(id="warmup", action="created", entity_type="client", entity_id="warmup", at=now),
+    ]
+    for response in responses:
+        type(response).model_validate(response.model_dump(mode="json"))
+
 # Auth Routes
 @api_router.post("/auth/register", response_model=TokenResponse)
-async def register(user_input: UserCreate):
+async def register(user_input: UserCreate, request: Request, credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)):
+    """Register into the caller's agency when an admin of it is signed in, into the
+    inviting agency with an invite code, and otherwise start a new agency.
+
+    The role comes from the signed-in admin or the invite, and each invite code works once;
+    whoever starts an agency is its admin.
+    """
+    await admit_auth_attempt(request, user_input.username)
+    
+    tenant_id = str(uuid.uuid4())
+    role = "admin"
+    invite = None
+    if credentials:
+        token_data = verify_token(credentials)
+        admin = await require_admin(token_data)
+        tenant_id = admin['tenant_id']
+        role = user_input.role
+        if role not in ROLES:
+            raise HTTPException(status_code=422, detail=f"Role must be one of {', '.join(ROLES)}")
+    elif user_input.invite_code:
+        invite = read_invite(user_input.invite_code)
+        tenant_id = invite['tenant_id']
+        role = invite['role']
+    
     # Check if username exists
-    existing_user = await db.users.find_one({"username": user_input.username})
+    existing_user = await repos.users.find_one({"username": user_input.username})
     if existing_user:
         raise HTTPException(status_code=400, detail="Username already exists")
     
     # Check if email exists
-    existing_email = await db.users.find_one({"email": user_input.email})
+    existing_email = await repos.users.find_one({"email": user_input.email})
     if existing_email:
         raise HTTPException(status_code=400, detail="Email already exists")
     
@@ -176,19 +621,23 @@ async def register(user_input: UserCreate):
     
     # Create user
     user = User(
+        tenant_id=tenant_id,
         username=user_input.username,
         email=user_input.email,
-        role=user_input.role
+        role=role
     )
     
     user_dict = user.model_dump()
     user_dict['password'] = hashed_password
     user_dict['created_at'] = user_dict['created_at'].isoformat()
     
-    await db.users.insert_one(user_dict)
+    # Invites are single-use: consume it only once the sign-up is known to be valid
+    if invite:
+        await use_invite(invite, user.id)
+    await repos.users.insert_one(user_dict)
     
     # Create token
-    access_token = create_access_token(data={"sub": user.username, "id": user.id})
+    access_token = create_access_token(data={"sub": user.username, "id": user.id, "tenant_id": user.tenant_id})
     
     return TokenResponse(
         access_token=access_token,
@@ -197,9 +646,11 @@ async def register(user_input: UserCreate):
     )
 
 @api_router.post("/auth/login", response_model=TokenResponse)
-async def login(credentials: UserLogin):
+async def login(credentials: UserLogin, request: Request):
+    await admit_auth_attempt(request, credentials.username)
+    
     # Find user
-    user_doc = await db.users.find_one({"username": credentials.username})
+    user_doc = await repos.users.find_one({"username": credentials.username})
     if not user_doc:
         raise HTTPException(status_code=401, detail="Invalid username or password")
     
@@ -208,7 +659,11 @@ async def login(credentials: UserLogin):
         raise HTTPException(status_code=401, detail="Invalid username or password")
     
     # Create token
-    access_token = create_access_token(data={"sub": user_doc['username'], "id": user_doc['id']})
+    access_token = create_access_token(data={
+        "sub": user_doc['username'],
+        "id": user_doc['id'],
+        "tenant_id": user_doc.get('tenant_id', DEFAULT_TENANT_ID)
+    })
     
     return TokenResponse(
         access_token=access_token,
@@ -217,13 +672,14 @@ async def login(credentials: UserLogin):
             id=user_doc['id'],
             username=user_doc['username'],
             email=user_doc['email'],
-            role=user_doc['role']
+            role=user_doc['role'],
+            tenant_id=user_doc.get('tenant_id', DEFAULT_TENANT_ID)
         )
     )
 
 @api_router.get("/auth/me", response_model=UserResponse)
 async def get_current_user(token_data: dict = Depends(verify_token)):
-    user_doc = await db.users.find_one({"id": token_data['id']})
+    user_doc = await repos.users.find_one({"id": token_data['id']})
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -231,22 +687,31 @@ async def get_current_user(token_data: dict = Depends(verify_token)):
         id=user_doc['id'],
         username=user_doc['username'],
         email=user_doc['email'],
-        role=user_doc['role']
+        role=user_doc['role'],
+        tenant_id=user_doc.get('tenant_id', DEFAULT_TENANT_ID)
     )
 
+@api_router.post("/invites", response_model=InviteResponse)
+async def create_invite_code(invite_input: InviteCreate, token_data: dict = Depends(require_admin)):
+    if invite_input.role not in ROLES:
+        raise HTTPException(status_code=422, detail=f"Role must be one of {', '.join(ROLES)}")
+    invite_code, expires_at = await create_invite(token_data['tenant_id'], invite_input.role, token_data['id'])
+    return InviteResponse(invite_code=invite_code, role=invite_input.role, expires_at=expires_at)
+
 # Client Routes
 @api_router.post("/clients", response_model=Client)
-async def create_client(client_input: ClientCreate, token_data: dict = Depends(verify_token)):
+async def create_client(client_input: ClientCreate, tenant_repos: TenantRepositories = Depends(get_tenant_repos), token_data: dict = Depends(verify_token)):
     client = Client(**client_input.model_dump())
     client_dict = client.model_dump()
     client_dict['created_at'] = client_dict['created_at'].isoformat()
     
-    await db.clients.insert_one(client_dict)
+    await tenant_repos.clients.insert_one(client_dict)
+    await activity_log.record(tenant_repos.tenant_id, token_data, "created", "client", client.id)
     return client
 
 @api_router.get("/clients", response_model=List[Client])
-async def get_clients(token_data: dict = Depends(verify_token)):
-    clients = await db.clients.find({}, {"_id": 0}).to_list(1000)
+async def get_clients(tenant_repos: TenantRepositories = Depends(get_tenant_repos)):
+    clients = await tenant_repos.clients.find({})
     
     for client in clients:
         if isinstance(client['created_at'], str):
@@ -255,8 +720,8 @@ async def get_clients(token_data: dict = Depends(verify_token)):
     return clients
 
 @api_router.get("/clients/{client_id}", response_model=Client)
-async def get_client(client_id: str, token_data: dict = Depends(verify_token)):
-    client = await db.clients.find_one({"id": client_id}, {"_id": 0})
+async def get_client(client_id: str, tenant_repos: TenantRepositories = Depends(get_tenant_repos)):
+    client = await tenant_repos.clients.find_one({"id": client_id})
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
     
@@ -266,32 +731,40 @@ async def get_client(client_id: str, token_data: dict = Depends(verify_token)):
     return client
 
 @api_router.put("/clients/{client_id}", response_model=Client)
-async def update_client(client_id: str, client_input: ClientCreate, token_data: dict = Depends(verify_token)):
-    existing = await db.clients.find_one({"id": client_id})
+async def update_client(client_id: str, client_input: ClientCreate, tenant_repos: TenantRepositories = Depends(get_tenant_repos), token_data: dict = Depends(verify_token)):
+    existing = await tenant_repos.clients.find_one({"id": client_id})
     if not existing:
         raise HTTPException(status_code=404, detail="Client not found")
     
     update_data = client_input.model_dump()
-    await db.clients.update_one({"id": client_id}, {"$set": update_data})
+    await tenant_repos.clients.update_one({"id": client_id}, update_data)
+    entity_caches["clients"].invalidate(tenant_repos.tenant_id, client_id)
     
-    updated_client = await db.clients.find_one({"id": client_id}, {"_id": 0})
+    updated_client = await tenant_repos.clients.find_one({"id": client_id})
     if isinstance(updated_client['created_at'], str):
         updated_client['created_at'] = datetime.fromisoformat(updated_client['created_at'])
     
+    await activity_log.record(tenant_repos.tenant_id, token_data, "updated", "client", client_id)
     return updated_client
 
 @api_router.delete("/clients/{client_id}")
-async def delete_client(client_id: str, token_data: dict = Depends(verify_token)):
-    result = await db.clients.delete_one({"id": client_id})
-    if result.deleted_count == 0:
+async def delete_client(client_id: str, tenant_repos: TenantRepositories = Depends(get_tenant_repos), token_data: dict = Depends(verify_token)):
+    deleted = await tenant_repos.clients.delete_one({"id": client_id})
+    entity_caches["clients"].invalidate(tenant_repos.tenant_id, client_id)
+    if not deleted:
         raise HTTPException(status_code=404, detail="Client not found")
+    await activity_log.record(tenant_repos.tenant_id, token_data, "deleted", "client", client_id)
     return {"message": "Client deleted successfully"}
 
+@api_router.post("/clients/batch-get", response_model=Dict[str, Client])
+async def batch_get_clients(batch: BatchGetRequest, tenant_repos: TenantRepositories = Depends(get_tenant_repos)):
+    return await batch_get(tenant_repos, "clients", batch.ids)
+
 # Project Routes
 @api_router.post("/projects", response_model=Project)
-async def create_project(project_input: ProjectCreate, token_data: dict = Depends(verify_token)):
+async def create_project(project_input: ProjectCreate, tenant_repos: TenantRepositories = Depends(get_tenant_repos), token_data: dict = Depends(verify_token)):
     # Verify client exists
-    client = await db.clients.find_one({"id": project_input.client_id})
+    client = await tenant_repos.clients.find_one({"id": project_input.client_id})
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
     
@@ -299,12 +772,13 @@ async def create_project(project_input: ProjectCreate, token_data: dict = Depend
     project_dict = project.model_dump()
     project_dict['created_at'] = project_dict['created_at'].isoformat()
     
-    await db.projects.insert_one(project_dict)
+    await tenant_repos.projects.insert_one(project_dict)
+    await activity_log.record(tenant_repos.tenant_id, token_data, "created", "project", project.id)
     return project
 
 @api_router.get("/projects", response_model=List[Project])
-async def get_projects(token_data: dict = Depends(verify_token)):
-    projects = await db.projects.find({}, {"_id": 0}).to_list(1000)
+async def get_projects(include_archived: bool = False, tenant_repos: TenantRepositories = Depends(get_tenant_repos)):
+    projects = await find_with_archive(tenant_repos, "projects", {}, include_archived)
     
     for project in projects:
         if isinstance(project['created_at'], str):
@@ -313,8 +787,8 @@ async def get_projects(token_data: dict = Depends(verify_token)):
     return projects
 
 @api_router.get("/projects/{project_id}", response_model=Project)
-async def get_project(project_id: str, token_data: dict = Depends(verify_token)):
-    project = await db.projects.find_one({"id": project_id}, {"_id": 0})
+async def get_project(project_id: str, include_archived: bool = False, tenant_repos: TenantRepositories = Depends(get_tenant_repos)):
+    project = await find_one_with_archive(tenant_repos, "projects", {"id": project_id}, include_archived)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
@@ -324,58 +798,124 @@ async def get_project(project_id: str, token_data: dict = Depends(verify_token))
     return project
 
 @api_router.put("/projects/{project_id}", response_model=Project)
-async def update_project(project_id: str, project_input: ProjectCreate, token_data: dict = Depends(verify_token)):
-    existing = await db.projects.find_one({"id": project_id})
+async def update_project(project_id: str, project_input: ProjectCreate, tenant_repos: TenantRepositories = Depends(get_tenant_repos), token_data: dict = Depends(verify_token)):
+    existing = await tenant_repos.projects.find_one({"id": project_id})
     if not existing:
         raise HTTPException(status_code=404, detail="Project not found")
     
     update_data = project_input.model_dump()
-    await db.projects.update_one({"id": project_id}, {"$set": update_data})
+    await tenant_repos.projects.update_one({"id": project_id}, update_data)
+    entity_caches["projects"].invalidate(tenant_repos.tenant_id, project_id)
     
-    updated_project = await db.projects.find_one({"id": project_id}, {"_id": 0})
+    updated_project = await tenant_repos.projects.find_one({"id": project_id})
     if isinstance(updated_project['created_at'], str):
         updated_project['created_at'] = datetime.fromisoformat(updated_project['created_at'])
     
+    await activity_log.record(tenant_repos.tenant_id, token_data, "updated", "project", project_id)
     return updated_project
 
 @api_router.delete("/projects/{project_id}")
-async def delete_project(project_id: str, token_data: dict = Depends(verify_token)):
-    result = await db.projects.delete_one({"id": project_id})
-    if result.deleted_count == 0:
+async def delete_project(project_id: str, tenant_repos: TenantRepositories = Depends(get_tenant_repos), token_data: dict = Depends(verify_token)):
+    deleted = await tenant_repos.projects.delete_one({"id": project_id})
+    entity_caches["projects"].invalidate(tenant_repos.tenant_id, project_id)
+    if not deleted:
         raise HTTPException(status_code=404, detail="Project not found")
+    await activity_log.record(tenant_repos.tenant_id, token_data, "deleted", "project", project_id)
     return {"message": "Project deleted successfully"}
 
+@api_router.post("/projects/batch-get", response_model=Dict[str, Project])
+async def batch_get_projects(batch: BatchGetRequest, tenant_repos: TenantRepositories = Depends(get_tenant_repos)):
+    return await batch_get(tenant_repos, "projects", batch.ids)
+
 # Team Routes
 @api_router.get("/team", response_model=List[UserResponse])
-async def get_team_members(token_data: dict = Depends(verify_token)):
-    users = await db.users.find({}, {"_id": 0, "password": 0}).to_list(1000)
+async def get_team_members(tenant_repos: TenantRepositories = Depends(get_tenant_repos)):
+    users = await tenant_repos.users.find({}, {"password": 0})
     return [UserResponse(**user) for user in users]
 
+@api_router.post("/users/batch-get", response_model=Dict[str, UserResponse])
+async def batch_get_users(batch: BatchGetRequest, tenant_repos: TenantRepositories = Depends(get_tenant_repos)):
+    return await batch_get(tenant_repos, "users", batch.ids, {"id": 1, "username": 1, "email": 1, "role": 1, "tenant_id": 1})
+
+@api_router.get("/team/workload", response_model=List[TeamWorkload])
+async def get_team_workload(tenant_repos: TenantRepositories = Depends(get_tenant_repos)):
+    workload = await tenant_repos.projects.team_workload()
+    return [TeamWorkload(**entry) for entry in workload]
+
+@api_router.get("/team/{user_id}/workload", response_model=TeamWorkload)
+async def get_team_member_workload(user_id: str, tenant_repos: TenantRepositories = Depends(get_tenant_repos)):
+    projects = await tenant_repos.projects.member_projects(user_id)
+    
+    return TeamWorkload(
+        user_id=user_id,
+        active_projects=len(projects),
+        project_ids=[project['id'] for project in projects],
+        budget_total=sum(project.get('budget') or 0 for project in projects)
+    )
+
 # Invoice Routes
 @api_router.post("/invoices", response_model=Invoice)
-async def create_invoice(invoice_input: InvoiceCreate, token_data: dict = Depends(verify_token)):
+async def create_invoice(invoice_input: InvoiceCreate, tenant_repos: TenantRepositories = Depends(get_tenant_repos), token_data: dict = Depends(verify_token)):
     # Verify client exists
-    client = await db.clients.find_one({"id": invoice_input.client_id})
+    client = await tenant_repos.clients.find_one({"id": invoice_input.client_id})
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
     
     # Generate invoice number
-    count = await db.invoices.count_documents({})
+    count = await count_issued_invoices(tenant_repos)
     invoice_number = f"INV-{count + 1:05d}"
     
     invoice = Invoice(
         invoice_number=invoice_number,
-        **invoice_input.model_dump()
+        **{**invoice_input.model_dump(), **compute_invoice_totals(invoice_input)}
     )
     invoice_dict = invoice.model_dump()
     invoice_dict['created_at'] = invoice_dict['created_at'].isoformat()
     
-    await db.invoices.insert_one(invoice_dict)
+    await tenant_repos.invoices.insert_one(invoice_dict)
+    await activity_log.record(tenant_repos.tenant_id, token_data, "created", "invoice", invoice.id)
     return invoice
 
+@api_router.post("/invoices/bulk", response_model=List[Invoice])
+async def create_invoices_bulk(invoice_inputs: List[InvoiceCreate], tenant_repos: TenantRepositories = Depends(get_tenant_repos), token_data: dict = Depends(verify_token)):
+    if len(invoice_inputs) > MAX_BULK_INVOICES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_INVOICES} invoices per request")
+    
+    # Reject the whole batch if any sent amount disagrees with the computed one
+    invalid = validate_invoice_batch(invoice_inputs)
+    if invalid:
+        raise HTTPException(status_code=422, detail={"message": "Invoice amounts do not match items", "invalid_indices": invalid})
+    
+    # Verify all clients exist with a single query
+    client_ids = list({invoice_input.client_id for invoice_input in invoice_inputs})
+    found = await tenant_repos.clients.find({"id": {"$in": client_ids}}, {"id": 1}, limit=len(client_ids))
+    missing = set(client_ids) - {doc['id'] for doc in found}
+    if missing:
+        raise HTTPException(status_code=404, detail={"message": "Client not found", "client_ids": sorted(missing)})
+    
+    count = await count_issued_invoices(tenant_repos)
+    invoices = [
+        Invoice(
+            invoice_number=f"INV-{count + offset:05d}",
+            **{**invoice_input.model_dump(), **compute_invoice_totals(invoice_input)}
+        )
+        for offset, invoice_input in enumerate(invoice_inputs, start=1)
+    ]
+    
+    invoice_dicts = []
+    for invoice in invoices:
+        invoice_dict = invoice.model_dump()
+        invoice_dict['created_at'] = invoice_dict['created_at'].isoformat()
+        invoice_dicts.append(invoice_dict)
+    await tenant_repos.invoices.insert_many(invoice_dicts)
+    for invoice in invoices:
+        await activity_log.record(tenant_repos.tenant_id, token_data, "created", "invoice", invoice.id)
+    
+    return invoices
+
 @api_router.get("/invoices", response_model=List[Invoice])
-async def get_invoices(token_data: dict = Depends(verify_token)):
-    invoices = await db.invoices.find({}, {"_id": 0}).to_list(1000)
+async def get_invoices(include_archived: bool = False, tenant_repos: TenantRepositories = Depends(get_tenant_repos)):
+    invoices = await find_with_archive(tenant_repos, "invoices", {}, include_archived)
     
     for invoice in invoices:
         if isinstance(invoice['created_at'], str):
@@ -384,8 +924,8 @@ async def get_invoices(token_data: dict = Depends(verify_token)):
     return invoices
 
 @api_router.get("/invoices/{invoice_id}", response_model=Invoice)
-async def get_invoice(invoice_id: str, token_data: dict = Depends(verify_token)):
-    invoice = await db.invoices.find_one({"id": invoice_id}, {"_id": 0})
+async def get_invoice(invoice_id: str, include_archived: bool = False, tenant_repos: TenantRepositories = Depends(get_tenant_repos)):
+    invoice = await find_one_with_archive(tenant_repos, "invoices", {"id": invoice_id}, include_archived)
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
     
@@ -395,49 +935,112 @@ async def get_invoice(invoice_id: str, token_data: dict = Depends(verify_token))
     return invoice
 
 @api_router.put("/invoices/{invoice_id}", response_model=Invoice)
-async def update_invoice(invoice_id: str, invoice_input: InvoiceCreate, token_data: dict = Depends(verify_token)):
-    existing = await db.invoices.find_one({"id": invoice_id})
+async def update_invoice(invoice_id: str, invoice_input: InvoiceCreate, tenant_repos: TenantRepositories = Depends(get_tenant_repos), token_data: dict = Depends(verify_token)):
+    existing = await tenant_repos.invoices.find_one({"id": invoice_id})
     if not existing:
         raise HTTPException(status_code=404, detail="Invoice not found")
     
-    update_data = invoice_input.model_dump()
-    await db.invoices.update_one({"id": invoice_id}, {"$set": update_data})
+    update_data = {**invoice_input.model_dump(), **compute_invoice_totals(invoice_input)}
+    await tenant_repos.invoices.update_one({"id": invoice_id}, update_data)
     
-    updated_invoice = await db.invoices.find_one({"id": invoice_id}, {"_id": 0})
+    updated_invoice = await tenant_repos.invoices.find_one({"id": invoice_id})
     if isinstance(updated_invoice['created_at'], str):
         updated_invoice['created_at'] = datetime.fromisoformat(updated_invoice['created_at'])
     
+    await activity_log.record(tenant_repos.tenant_id, token_data, "updated", "invoice", invoice_id)
     return updated_invoice
 
 @api_router.delete("/invoices/{invoice_id}")
-async def delete_invoice(invoice_id: str, token_data: dict = Depends(verify_token)):
-    result = await db.invoices.delete_one({"id": invoice_id})
-    if result.deleted_count == 0:
+async def delete_invoice(invoice_id: str, tenant_repos: TenantRepositories = Depends(get_tenant_repos), token_data: dict = Depends(verify_token)):
+    deleted = await tenant_repos.invoices.delete_one({"id": invoice_id})
+    if not deleted:
         raise HTTPException(status_code=404, detail="Invoice not found")
+    await activity_log.record(tenant_repos.tenant_id, token_data, "deleted", "invoice", invoice_id)
     return {"message": "Invoice deleted successfully"}
 
+# Health Routes
+@api_router.get("/health")
+async def get_health():
+    if not worker_stats['ready']:
+        raise HTTPException(status_code=503, detail="Worker is warming up")
+    return worker_stats
+
+# Activity Routes
+@api_router.get("/activity", response_model=List[ActivityEntry])
+async def get_activity(
+    skip: int = 0,
+    limit: int = 50,
+    entity_type: Optional[str] = None,
+    tenant_repos: TenantRepositories = Depends(get_tenant_repos)
+):
+    query = {"entity_type": entity_type} if entity_type else {}
+    entries = await tenant_repos.activity.find(query, skip=max(skip, 0), limit=min(max(limit, 1), 200), sort=[("at", -1)])
+    
+    for entry in entries:
+        if isinstance(entry['at'], str):
+            entry['at'] = datetime.fromisoformat(entry['at'])
+    
+    return entries
+
 # Dashboard Stats
 @api_router.get("/dashboard/stats")
-async def get_dashboard_stats(token_data: dict = Depends(verify_token)):
-    total_clients = await db.clients.count_documents({})
-    active_projects = await db.projects.count_documents({"status": "active"})
-    total_projects = await db.projects.count_documents({})
+async def get_dashboard_stats(tenant_repos: TenantRepositories = Depends(get_tenant_repos)):
+    total_clients = await tenant_repos.clients.count({})
+    active_projects = await tenant_repos.projects.count({"status": "active"})
+    total_projects = await tenant_repos.projects.count({})
+    # Archived projects and paid invoices still count towards the totals
+    archived_projects = await tenant_repos.projects_archive.count(SETTLED)
     
-    # Calculate total revenue from paid invoices
-    paid_invoices = await db.invoices.find({"status": "paid"}, {"_id": 0}).to_list(1000)
-    total_revenue = sum(invoice['amount'] for invoice in paid_invoices)
+    # Calculate total revenue from paid invoices (covered by the status/amount index)
+    revenue = await tenant_repos.invoices.sum_amount({"status": "paid"})
+    total_revenue = revenue + await tenant_repos.invoices_archive.sum_amount(SETTLED)
     
     # Calculate pending invoices
-    pending_invoices = await db.invoices.count_documents({"status": {"$in": ["pending", "overdue"]}})
+    pending_invoices = await tenant_repos.invoices.count({"status": {"$in": ["pending", "overdue"]}})
     
     return {
         "total_clients": total_clients,
         "active_projects": active_projects,
-        "total_projects": total_projects,
+        "total_projects": total_projects + archived_projects,
         "total_revenue": total_revenue,
         "pending_invoices": pending_invoices
     }
 
+# Admin Routes
+@api_router.post("/admin/archive")
+async def run_archive(older_than_days: int = ARCHIVE_AFTER_DAYS, token_data: dict = Depends(require_admin), tenant_repos: TenantRepositories = Depends(get_tenant_repos)):
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    archived = await archive_tenant(tenant_repos, cutoff, ARCHIVE_BATCH_SIZE, entity_caches)
+    return {"cutoff": cutoff.isoformat(), "archived": archived}
+
+@api_router.get("/admin/rate-limits")
+async def get_rate_limit_counters(token_data: dict = Depends(require_platform_admin)):
+    return {"backend": type(bucket_store).__name__, **auth_rate_limiter.counters}
+
+@api_router.get("/admin/entity-cache")
+async def get_entity_cache_stats(token_data: dict = Depends(require_platform_admin)):
+    return {name: {"hits": cache.hits, "misses": cache.misses} for name, cache in entity_caches.items()}
+
+@api_router.get("/admin/activity-log")
+async def get_activity_log_stats(token_data: dict = Depends(require_platform_admin)):
+    return activity_log.stats()
+
+def profile_scope(token_data: dict) -> Optional[str]:
+    # Agency admins see the profiles of their own agency's requests, platform admins see all
+    return None if token_data['platform_admin'] else token_data['tenant_id']
+
+@api_router.get("/admin/profiles")
+async def get_profiles(token_data: dict = Depends(require_admin)):
+    return profile_store.summaries(profile_scope(token_data))
+
+@api_router.get("/admin/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile_flamegraph(profile_id: str, token_data: dict = Depends(require_admin)):
+    # Folded stacks, ready for flamegraph.pl or speedscope
+    profile = profile_store.get(profile_id, profile_scope(token_data))
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile['folded']
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -447,8 +1050,80 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Profile-Id"],
 )
 
+def request_token(request: Request) -> Optional[dict]:
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.InvalidTokenError:
+        return None
+
+async def is_admin_request(payload: Optional[dict]) -> bool:
+    if payload is None:
+        return False
+    user_doc = await repos.users.find_one({"id": payload.get('id')}, {"role": 1})
+    return bool(user_doc) and user_doc.get('role') == "admin"
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    # Only an admin's explicit request gets the timings back; sampled profiles are just stored
+    payload = request_token(request) if request.headers.get("X-Profile") == "1" else None
+    requested = await is_admin_request(payload)
+    sampled = not requested and PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+    if not (requested or sampled):
+        return await call_next(request)
+    
+    timings = RequestTimings()
+    timings_token = current_timings.set(timings)
+    sampler = StackSampler(threading.get_ident())
+    sampler.start()
+    try:
+        response = await call_next(request)
+    finally:
+        sampler.stop()
+        current_timings.reset(timings_token)
+    
+    if sampled:
+        payload = request_token(request)
+    # Anonymous requests are filed under no agency, so only platform admins see them
+    tenant_id = payload.get('tenant_id', DEFAULT_TENANT_ID) if payload else None
+    profile_id = profile_store.add(request.method, request.url.path, timings, sampler, tenant_id)
+    if requested:
+        response.headers["Server-Timing"] = timings.server_timing()
+        response.headers["X-Profile-Id"] = profile_id
+    return response
+
+class ColdRequestTimer:
+    """Times the worker's first HTTP request, whether or not it is profiled.
+
+    A plain ASGI wrapper rather than another @app.middleware: those run each
+    response through an extra task and body stream, which here delayed the
+    end of responses past the client's disconnect so that uvicorn stopped
+    counting requests for --limit-max-requests.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != "http" or worker_stats['cold_request_ms'] is not None:
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if worker_stats['cold_request_ms'] is None:
+                worker_stats['cold_request_ms'] = round((time.perf_counter() - start) * 1000, 2)
+                logger.info(f"Worker {os.getpid()} served its first request in {worker_stats['cold_request_ms']} ms")
+
+# Added last so it wraps the profiler
+app.add_middleware(ColdRequestTimer)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -456,6 +1131,26 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def prepare_database():
+    # Databases from before multi-tenancy are migrated once with `python migrate.py backfill-tenant`
+    await repos.create_indexes()
+    await bucket_store.create_indexes()
+    if SHARD_COLLECTIONS:
+        await repos.shard_collections()
+    activity_log.start()
+    
+    # Open the Mongo pool and warm the validators before the worker reports ready
+    warmup_start = time.perf_counter()
+    await repos.ping()
+    warm_up_models()
+    worker_stats['warmup_ms'] = round((time.perf_counter() - warmup_start) * 1000, 2)
+    worker_stats['startup_ms'] = round((time.perf_counter() - process_started) * 1000, 2)
+    worker_stats['ready'] = True
+    logger.info(f"Worker {os.getpid()} ready in {worker_stats['startup_ms']} ms (warm-up {worker_stats['warmup_ms']} ms)")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    # Drain queued activity entries while the connection is still open
+    await activity_log.stop()
+    repos.close()
\ No newline at end of file
@@ -19,7 +19,7 @@ export default function Login() {
     username: "",
     email: "",
     password: "",
-    role: "team_member"
+    invite_code: ""
   });
 
   const handleLogin = async (e) => {
@@ -42,7 +42,11 @@ export default function Login() {
     e.preventDefault();
     setLoading(true);
     try {
-      const response = await axios.post(`${API}/auth/register`, registerData);
+      // Without an invite code the new account starts its own agency
+      const response = await axios.post(`${API}/auth/register`, {
+        ...registerData,
+        invite_code: registerData.invite_code.trim() || undefined,
+      });
       localStorage.setItem("token", response.data.access_token);
       localStorage.setItem("user", JSON.stringify(response.data.user));
       toast.success("Account created successfully!");
@@ -112,7 +116,7 @@ export default function Login() {
             <TabsContent value="register">
               <CardHeader>
                 <CardTitle>Create Account</CardTitle>
-                <CardDescription>Fill in your details to get started</CardDescription>
+                <CardDescription>Start a new agency, or paste the invite code from your agency admin to join the team</CardDescription>
               </CardHeader>
               <CardContent>
                 <form onSubmit={handleRegister} className="space-y-4">
@@ -151,6 +155,16 @@ export default function Login() {
                       required
                     />
                   </div>
+                  <div className="space-y-2">
+                    <Label htmlFor="register-invite-code">Invite Code</Label>
+                    <Input
+                      id="register-invite-code"
+                      data-testid="register-invite-code-input"
+                      placeholder="Optional, to join an existing agency"
+                      value={registerData.invite_code}
+                      onChange={(e) => setRegisterData({ ...registerData, invite_code: e.target.value })}
+                    />
+                  </div>
                   <Button type="submit" className="w-full" disabled={loading} data-testid="register-submit-button" style={{ background: 'linear-gradient(135deg, #4a7c7e 0%, #6b9b9e 100%)' }}>
                     {loading ? "Creating Account..." : "Register"}
                   </Button>
@@ -1,13 +1,23 @@
 import { useState, useEffect } from "react";
 import Layout from "@/components/Layout";
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
-import { UserCircle, Mail } from "lucide-react";
+import { Button } from "@/components/ui/button";
+import { Input } from "@/components/ui/input";
+import { Label } from "@/components/ui/label";
+import { Dialog, DialogContent, DialogDescription, DialogHeader, DialogTitle, DialogTrigger, DialogFooter } from "@/components/ui/dialog";
+import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select";
+import { UserCircle, Mail, Briefcase, UserPlus, Copy } from "lucide-react";
 import { api } from "@/App";
 import { toast } from "sonner";
 
 export default function Team() {
   const [teamMembers, setTeamMembers] = useState([]);
+  const [workload, setWorkload] = useState({});
   const [loading, setLoading] = useState(true);
+  const [inviteOpen, setInviteOpen] = useState(false);
+  const [inviteRole, setInviteRole] = useState("team_member");
+  const [invite, setInvite] = useState(null);
+  const user = JSON.parse(localStorage.getItem("user") || "{}");
 
   useEffect(() => {
     fetchTeam();
@@ -15,8 +25,12 @@ export default function Team() {
 
   const fetchTeam = async () => {
     try {
-      const response = await api.get("/team");
-      setTeamMembers(response.data);
+      const [teamResponse, workloadResponse] = await Promise.all([
+        api.get("/team"),
+        api.get("/team/workload"),
+      ]);
+      setTeamMembers(teamResponse.data);
+      setWorkload(Object.fromEntries(workloadResponse.data.map((entry) => [entry.user_id, entry])));
     } catch (error) {
       toast.error("Failed to load team members");
     } finally {
@@ -24,12 +38,78 @@ export default function Team() {
     }
   };
 
+  const createInvite = async () => {
+    try {
+      const response = await api.post("/invites", { role: inviteRole });
+      setInvite(response.data);
+    } catch (error) {
+      toast.error(error.response?.data?.detail || "Failed to create invite");
+    }
+  };
+
+  const copyInvite = async () => {
+    await navigator.clipboard.writeText(invite.invite_code);
+    toast.success("Invite code copied");
+  };
+
   return (
     <Layout>
       <div className="space-y-6">
-        <div>
-          <h1 className="text-4xl font-bold mb-2" style={{ color: '#2c5557' }}>Team</h1>
-          <p className="text-base" style={{ color: '#5a7879' }}>Your agency team members</p>
+        <div className="flex items-center justify-between">
+          <div>
+            <h1 className="text-4xl font-bold mb-2" style={{ color: '#2c5557' }}>Team</h1>
+            <p className="text-base" style={{ color: '#5a7879' }}>Your agency team members</p>
+          </div>
+          {user.role === "admin" && (
+            <Dialog open={inviteOpen} onOpenChange={(open) => { setInviteOpen(open); if (!open) setInvite(null); }}>
+              <DialogTrigger asChild>
+                <Button className="gap-2" style={{ background: 'linear-gradient(135deg, #4a7c7e 0%, #6b9b9e 100%)' }} data-testid="invite-member-button">
+                  <UserPlus className="w-4 h-4" /> Invite Member
+                </Button>
+              </DialogTrigger>
+              <DialogContent>
+                <DialogHeader>
+                  <DialogTitle>Invite a Team Member</DialogTitle>
+                  <DialogDescription>
+                    Share the code; it is entered on the Register tab and joins this agency
+                  </DialogDescription>
+                </DialogHeader>
+                <div className="space-y-4">
+                  <div className="space-y-2">
+                    <Label htmlFor="invite-role">Role</Label>
+                    <Select value={inviteRole} onValueChange={(value) => { setInviteRole(value); setInvite(null); }}>
+                      <SelectTrigger id="invite-role" data-testid="invite-role-select">
+                        <SelectValue />
+                      </SelectTrigger>
+                      <SelectContent>
+                        <SelectItem value="team_member">Team Member</SelectItem>
+                        <SelectItem value="admin">Admin</SelectItem>
+                      </SelectContent>
+                    </Select>
+                  </div>
+                  {invite && (
+                    <div className="space-y-2">
+                      <Label htmlFor="invite-code">Invite Code</Label>
+                      <div className="flex gap-2">
+                        <Input id="invite-code" data-testid="invite-code-output" value={invite.invite_code} readOnly />
+                        <Button type="button" variant="outline" onClick={copyInvite} data-testid="copy-invite-button">
+                          <Copy className="w-4 h-4" />
+                        </Button>
+                      </div>
+                      <p className="text-xs" style={{ color: '#5a7879' }}>
+                        Works for one sign-up until {new Date(invite.expires_at).toLocaleDateString()}
+                      </p>
+                    </div>
+                  )}
+                </div>
+                <DialogFooter>
+                  <Button onClick={createInvite} data-testid="create-invite-button" style={{ background: 'linear-gradient(135deg, #4a7c7e 0%, #6b9b9e 100%)' }}>
+                    {invite ? "New Code" : "Create Code"}
+                  </Button>
+                </DialogFooter>
+              </DialogContent>
+            </Dialog>
+          )}
         </div>
 
         {loading ? (
@@ -50,7 +130,7 @@ export default function Team() {
             <CardContent className="py-16 text-center">
               <UserCircle className="w-16 h-16 mx-auto mb-4" style={{ color: '#4a7c7e', opacity: 0.5 }} />
               <p className="text-lg mb-2" style={{ color: '#2c5557' }}>No team members yet</p>
-              <p style={{ color: '#5a7879' }}>Team members will appear here once registered</p>
+              <p style={{ color: '#5a7879' }}>Team members will appear here once they join with an invite code</p>
             </CardContent>
           </Card>
         ) : (
@@ -73,6 +153,10 @@ export default function Team() {
                     <Mail className="w-4 h-4" />
                     <span className="truncate">{member.email}</span>
                   </div>
+                  <div className="flex items-center gap-2 text-sm mt-2" style={{ color: '#5a7879' }} data-testid={`team-member-workload-${member.id}`}>
+                    <Briefcase className="w-4 h-4" />
+                    <span>{workload[member.id]?.active_projects || 0} active projects</span>
+                  </div>
                 </CardContent>
               </Card>
             ))}
@@ -0,0 +1,11 @@
+import os
+import sys
+from pathlib import Path
+
+# The backend modules import each other as top-level modules, as uvicorn runs them from backend/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+# Run the app on the in-memory repositories; set before server.py is first imported
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+# Every test client connects from the same address
+os.environ.setdefault("AUTH_IP_BURST", "1000")
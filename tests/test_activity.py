@@ -0,0 +1,160 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from activity import ActivityLog
+from repositories import MemoryRepository
+
+ACTOR = {"id": "u1", "sub": "alice"}
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class RecordingRepository(MemoryRepository):
+    """Keeps the size of every insert_many; writes wait while `gate` is clear."""
+
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+        self.gate = None
+
+    async def insert_many(self, docs):
+        if self.gate is not None:
+            await self.gate.wait()
+        self.batches.append(len(docs))
+        await super().insert_many(docs)
+
+
+async def record(log, count, start=0):
+    for index in range(start, start + count):
+        await log.record("agency-a", ACTOR, "created", "client", f"c{index}")
+
+
+async def until(condition, timeout=1.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.005)
+
+
+def test_full_batches_are_written_without_waiting_for_the_interval():
+    async def scenario():
+        repository = RecordingRepository()
+        log = ActivityLog(repository, batch_size=3, flush_interval=60)
+        log.start()
+        await record(log, 7)
+        await until(lambda: log.written == 6)
+        assert repository.batches == [3, 3]
+        await log.stop()
+        return repository.batches
+
+    assert run(scenario()) == [3, 3, 1]
+
+
+def test_partial_batches_are_written_after_the_interval():
+    async def scenario():
+        repository = RecordingRepository()
+        log = ActivityLog(repository, batch_size=100, flush_interval=0.05)
+        log.start()
+        await record(log, 2)
+        await asyncio.sleep(0.01)
+        assert log.written == 0
+        await until(lambda: log.written == 2)
+        await log.stop()
+        return repository.batches
+
+    assert run(scenario()) == [2]
+
+
+def test_record_waits_for_room_when_the_queue_is_full():
+    async def scenario():
+        repository = RecordingRepository()
+        repository.gate = asyncio.Event()
+        log = ActivityLog(repository, batch_size=1, flush_interval=60, max_queued=2)
+        log.start()
+        # The flusher takes the first entry and is held in its write; the next two fill the queue
+        await record(log, 1)
+        await until(lambda: log.stats()["queued"] == 0)
+        await record(log, 2, start=1)
+
+        blocked = asyncio.create_task(record(log, 1, start=3))
+        await asyncio.sleep(0.05)
+        assert not blocked.done()
+        assert log.stats()["queued"] == 2
+
+        repository.gate.set()
+        await asyncio.wait_for(blocked, 1)
+        await log.stop()
+        return log.stats(), await repository.count({})
+
+    assert run(scenario()) == ({"queued": 0, "written": 4, "failed": 0}, 4)
+
+
+def test_stop_writes_everything_still_queued():
+    async def scenario():
+        repository = RecordingRepository()
+        log = ActivityLog(repository, batch_size=2, flush_interval=60)
+        log.start()
+        await record(log, 5)
+        await log.stop()
+        return repository.batches, await repository.find({}, sort=[("entity_id", 1)])
+
+    batches, entries = run(scenario())
+    assert batches == [2, 2, 1]
+    assert [entry["entity_id"] for entry in entries] == [f"c{index}" for index in range(5)]
+    assert entries[0]["actor"] == "alice" and entries[0]["tenant_id"] == "agency-a"
+
+
+def test_failed_writes_are_counted_and_the_flusher_keeps_going():
+    class FailingOnce(RecordingRepository):
+        async def insert_many(self, docs):
+            if not self.batches:
+                self.batches.append(0)
+                raise RuntimeError("write failed")
+            await super().insert_many(docs)
+
+    async def scenario():
+        log = ActivityLog(FailingOnce(), batch_size=2, flush_interval=60)
+        log.start()
+        await record(log, 3)
+        await log.stop()
+        return log.stats()
+
+    assert run(scenario()) == {"queued": 0, "written": 1, "failed": 2}
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(server.app) as client:
+        yield client
+
+
+def test_activity_is_paged_newest_first(client):
+    name = f"user-{uuid.uuid4().hex[:8]}"
+    response = client.post("/api/auth/register", json={"username": name, "email": f"{name}@example.com", "password": "secret"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    tenant = server.repos.for_tenant(response.json()["user"]["tenant_id"])
+
+    start = datetime.now(timezone.utc)
+    run(tenant.activity.insert_many([
+        {"id": f"a{index}", "action": "created", "entity_type": "client" if index % 2 else "invoice",
+         "entity_id": f"e{index}", "at": (start + timedelta(seconds=index)).isoformat()}
+        for index in range(5)
+    ]))
+
+    def page(**params):
+        response = client.get("/api/activity", params=params, headers=headers)
+        assert response.status_code == 200, response.text
+        return [entry["id"] for entry in response.json()]
+
+    assert page() == ["a4", "a3", "a2", "a1", "a0"]
+    assert page(skip=1, limit=2) == ["a3", "a2"]
+    assert page(skip=4, limit=2) == ["a0"]
+    assert page(entity_type="client") == ["a3", "a1"]
+    assert page(limit=0) == ["a4"]
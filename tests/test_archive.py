@@ -0,0 +1,119 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from archive import archive_collection, archive_tenant
+from repositories import create_memory_repositories
+from server import count_issued_invoices, find_one_with_archive, find_with_archive, get_dashboard_stats
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+OLD = (datetime.now(timezone.utc) - timedelta(days=400)).isoformat()
+CUTOFF = datetime.now(timezone.utc) - timedelta(days=180)
+
+
+@pytest.fixture
+def tenant():
+    return create_memory_repositories().for_tenant("agency-a")
+
+
+def invoice(invoice_id, status="paid", amount=100.0, created_at=OLD):
+    return {"id": invoice_id, "invoice_number": f"INV-{invoice_id}", "client_id": "client",
+            "amount": amount, "status": status, "due_date": "2025-01-01", "created_at": created_at}
+
+
+async def totals(tenant):
+    stats = await get_dashboard_stats(tenant_repos=tenant)
+    return stats['total_revenue'], await count_issued_invoices(tenant)
+
+
+def test_archive_moves_only_matching_documents(tenant):
+    recent = datetime.now(timezone.utc).isoformat()
+    run(tenant.invoices.insert_many([invoice("i1"), invoice("i2", status="pending"), invoice("i3", created_at=recent)]))
+
+    assert run(archive_collection(tenant, "invoices", CUTOFF)) == 1
+    assert [doc['id'] for doc in run(tenant.invoices.find({}))] == ["i2", "i3"]
+    assert [doc['id'] for doc in run(tenant.invoices_archive.find({}))] == ["i1"]
+    assert run(totals(tenant)) == (200.0, 3)
+
+
+def test_archive_keeps_documents_changed_after_they_were_copied(tenant):
+    run(tenant.invoices.insert_many([invoice("i1"), invoice("i2")]))
+    upsert_many = tenant.invoices_archive.upsert_many
+
+    async def reopen_after_copy(docs):
+        await upsert_many(docs)
+        await tenant.invoices.update_one({"id": "i1"}, {"status": "overdue"})
+
+    tenant.invoices_archive.upsert_many = reopen_after_copy
+
+    assert run(archive_collection(tenant, "invoices", CUTOFF)) == 1
+    assert run(tenant.invoices.find_one({"id": "i1"}))['status'] == "overdue"
+    assert [doc['id'] for doc in run(tenant.invoices_archive.find({}))] == ["i2"]
+    assert run(totals(tenant)) == (100.0, 2)
+
+
+@pytest.mark.parametrize("deleted", [False, True])
+def test_rerun_finishes_an_interrupted_run(tenant, deleted):
+    # The run stopped after copying i1, either before or after removing it from the hot collection
+    run(tenant.invoices.insert_many([invoice("i1"), invoice("i2")]))
+    run(tenant.invoices_archive.upsert_many([{**invoice("i1"), "archiving": True}]))
+    if deleted:
+        run(tenant.invoices.delete_one({"id": "i1"}))
+
+    assert run(totals(tenant)) == ((100.0, 1) if deleted else (200.0, 2))
+    assert [doc['id'] for doc in run(find_with_archive(tenant, "invoices", {}, True))] == (["i2"] if deleted else ["i1", "i2"])
+
+    run(archive_collection(tenant, "invoices", CUTOFF))
+    assert run(tenant.invoices.find({})) == []
+    assert sorted(doc['id'] for doc in run(tenant.invoices_archive.find({"archiving": False}))) == ["i1", "i2"]
+    assert run(totals(tenant)) == (200.0, 2)
+
+
+def test_include_archived_lists_each_document_once(tenant):
+    run(tenant.invoices.insert_many([invoice("i1"), invoice("i2", status="pending")]))
+    run(archive_collection(tenant, "invoices", CUTOFF))
+    # A stray settled copy of a document that is also hot
+    run(tenant.invoices_archive.upsert_many([{**invoice("i2"), "archiving": False}]))
+
+    docs = run(find_with_archive(tenant, "invoices", {}, True))
+    assert sorted(doc['id'] for doc in docs) == ["i1", "i2"]
+    assert next(doc for doc in docs if doc['id'] == "i2")['status'] == "pending"
+    assert [doc['id'] for doc in run(find_with_archive(tenant, "invoices", {}, False))] == ["i2"]
+    assert run(find_one_with_archive(tenant, "invoices", {"id": "i1"}, False)) is None
+    assert run(find_one_with_archive(tenant, "invoices", {"id": "i1"}, True))['id'] == "i1"
+
+
+def test_dashboard_counts_archived_projects_and_revenue(tenant):
+    run(tenant.invoices.insert_many([invoice("i1", amount=40.0), invoice("i2", amount=60.0), invoice("i3", status="pending")]))
+    run(tenant.projects.insert_many([
+        {"id": "p1", "name": "Old", "client_id": "client", "status": "completed", "team_members": [], "created_at": OLD},
+        {"id": "p2", "name": "Live", "client_id": "client", "status": "active", "team_members": [], "created_at": OLD},
+    ]))
+    before = run(get_dashboard_stats(tenant_repos=tenant))
+
+    run(archive_collection(tenant, "invoices", CUTOFF, batch_size=1))
+    run(archive_collection(tenant, "projects", CUTOFF))
+
+    assert run(get_dashboard_stats(tenant_repos=tenant)) == before
+    assert before['total_revenue'] == 100.0
+    assert before['total_projects'] == 2
+
+
+def test_archive_tenant_runs_for_every_agency():
+    repos = create_memory_repositories()
+    for tenant_id in ("agency-a", "agency-b"):
+        tenant = repos.for_tenant(tenant_id)
+        run(tenant.users.insert_one({"id": f"admin-{tenant_id}", "username": tenant_id, "role": "admin"}))
+        run(tenant.invoices.insert_one(invoice(f"{tenant_id}-i1")))
+
+    tenant_ids = run(repos.tenant_ids())
+    assert tenant_ids == ["agency-a", "agency-b"]
+    for tenant_id in tenant_ids:
+        assert run(archive_tenant(repos.for_tenant(tenant_id), CUTOFF)) == {"invoices": 1, "projects": 0}
+    assert run(repos.invoices.count({})) == 0
+    assert run(repos.invoices_archive.count({"archiving": False})) == 2
@@ -0,0 +1,117 @@
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(server.app) as client:
+        yield client
+
+
+def register(client, role="team_member", headers=None):
+    name = f"user-{uuid.uuid4().hex[:8]}"
+    response = client.post(
+        "/api/auth/register",
+        json={"username": name, "email": f"{name}@example.com", "password": "secret", "role": role},
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}, response.json()["user"]
+
+
+def test_signing_up_starts_an_agency_run_by_its_founder(client):
+    _, founder = register(client, role="team_member")
+    _, other = register(client, role="admin")
+    assert founder["role"] == other["role"] == "admin"
+    assert founder["tenant_id"] != other["tenant_id"]
+
+
+def test_admins_add_users_to_their_own_agency(client):
+    admin_headers, admin = register(client)
+    _, member = register(client, role="team_member", headers=admin_headers)
+    assert member["role"] == "team_member"
+    assert member["tenant_id"] == admin["tenant_id"]
+
+    team = client.get("/api/team", headers=admin_headers).json()
+    assert {user["id"] for user in team} == {admin["id"], member["id"]}
+
+
+def test_members_cannot_register_users(client):
+    admin_headers, _ = register(client)
+    member_headers, _ = register(client, headers=admin_headers)
+    response = client.post(
+        "/api/auth/register",
+        json={"username": f"user-{uuid.uuid4().hex[:8]}", "email": "x@example.com", "password": "secret", "role": "admin"},
+        headers=member_headers,
+    )
+    assert response.status_code == 403
+
+
+@pytest.mark.parametrize("path", ["/api/admin/rate-limits", "/api/admin/entity-cache", "/api/admin/activity-log"])
+def test_process_wide_stats_need_a_platform_admin(client, monkeypatch, path):
+    admin_headers, admin = register(client)
+    assert client.get(path, headers=admin_headers).status_code == 403
+
+    monkeypatch.setattr(server, "PLATFORM_ADMINS", {admin["username"]})
+    assert client.get(path, headers=admin_headers).status_code == 200
+
+
+def join_with_invite(client, invite_code):
+    name = f"user-{uuid.uuid4().hex[:8]}"
+    return client.post(
+        "/api/auth/register",
+        json={"username": name, "email": f"{name}@example.com", "password": "secret", "role": "admin", "invite_code": invite_code},
+    )
+
+
+def test_invites_join_the_inviting_agency_with_the_invited_role(client):
+    admin_headers, admin = register(client)
+    invite = client.post("/api/invites", json={"role": "team_member"}, headers=admin_headers).json()
+
+    joined = join_with_invite(client, invite["invite_code"])
+    assert joined.status_code == 200
+    assert joined.json()["user"]["tenant_id"] == admin["tenant_id"]
+    assert joined.json()["user"]["role"] == "team_member"
+
+
+@pytest.mark.parametrize("role", ["team_member", "admin"])
+def test_invites_can_only_be_used_once(client, role):
+    admin_headers, _ = register(client)
+    invite_code = client.post("/api/invites", json={"role": role}, headers=admin_headers).json()["invite_code"]
+
+    assert join_with_invite(client, invite_code).status_code == 200
+    reused = join_with_invite(client, invite_code)
+    assert reused.status_code == 400
+    assert reused.json()["detail"] == "Invite code has already been used"
+
+
+def test_failed_sign_up_keeps_the_invite(client):
+    admin_headers, admin = register(client)
+    invite_code = client.post("/api/invites", json={}, headers=admin_headers).json()["invite_code"]
+
+    taken = client.post(
+        "/api/auth/register",
+        json={"username": admin["username"], "email": "other@example.com", "password": "secret", "invite_code": invite_code},
+    )
+    assert taken.status_code == 400
+    assert join_with_invite(client, invite_code).status_code == 200
+
+
+def test_only_admins_issue_invites(client):
+    admin_headers, _ = register(client)
+    member_headers, _ = register(client, headers=admin_headers)
+    assert client.post("/api/invites", json={}, headers=member_headers).status_code == 403
+    assert client.post("/api/invites", json={"role": "owner"}, headers=admin_headers).status_code == 422
+
+
+def test_invites_and_access_tokens_are_not_interchangeable(client):
+    admin_headers, _ = register(client)
+    invite_code = client.post("/api/invites", json={}, headers=admin_headers).json()["invite_code"]
+
+    assert client.get("/api/clients", headers={"Authorization": f"Bearer {invite_code}"}).status_code == 401
+    assert join_with_invite(client, admin_headers["Authorization"].split()[1]).status_code == 400
+    assert join_with_invite(client, "not-a-code").status_code == 400
@@ -0,0 +1,61 @@
+import asyncio
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def tenant_repos():
+    tenant_repos = server.repos.for_tenant(str(uuid.uuid4()))
+    run(tenant_repos.clients.insert_many([
+        {"id": f"client-{tenant_repos.tenant_id}-{index}", "name": f"Client {index}", "created_at": "2024-01-01T00:00:00+00:00"}
+        for index in range(3)
+    ]))
+    return tenant_repos
+
+
+def client_id(tenant_repos, index):
+    return f"client-{tenant_repos.tenant_id}-{index}"
+
+
+def test_batch_get_keys_by_id_and_skips_unknown_ids(tenant_repos):
+    ids = [client_id(tenant_repos, 2), "missing", client_id(tenant_repos, 0), client_id(tenant_repos, 2)]
+    found = run(server.batch_get(tenant_repos, "clients", ids))
+
+    assert list(found) == [client_id(tenant_repos, 2), client_id(tenant_repos, 0)]
+    assert found[client_id(tenant_repos, 0)]["name"] == "Client 0"
+
+
+def test_batch_get_serves_repeats_from_the_cache(tenant_repos):
+    cache = server.entity_caches["clients"]
+    ids = [client_id(tenant_repos, 0), client_id(tenant_repos, 1)]
+    run(server.batch_get(tenant_repos, "clients", ids))
+    hits = cache.hits
+
+    run(server.batch_get(tenant_repos, "clients", ids))
+    assert cache.hits == hits + 2
+
+    cache.invalidate(tenant_repos.tenant_id, ids[0])
+    run(tenant_repos.clients.update_one({"id": ids[0]}, {"name": "Renamed"}))
+    assert run(server.batch_get(tenant_repos, "clients", ids))[ids[0]]["name"] == "Renamed"
+
+
+def test_batch_get_does_not_cross_tenants(tenant_repos):
+    other = server.repos.for_tenant(str(uuid.uuid4()))
+    ids = [client_id(tenant_repos, 0)]
+    run(server.batch_get(tenant_repos, "clients", ids))
+    # Neither the cache nor the query hands another agency's documents out
+    assert run(server.batch_get(other, "clients", ids)) == {}
+
+
+def test_batch_get_limits_the_number_of_ids(tenant_repos):
+    with pytest.raises(HTTPException) as error:
+        run(server.batch_get(tenant_repos, "clients", [str(index) for index in range(server.MAX_BATCH_GET_IDS + 1)]))
+    assert error.value.status_code == 413
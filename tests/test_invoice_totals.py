@@ -0,0 +1,99 @@
+import pytest
+from fastapi import HTTPException
+
+from server import Invoice, InvoiceCreate, InvoiceItem, compute_invoice_totals, validate_invoice_batch
+
+
+def make_invoice(items, amount=None, tax_rate=0.0):
+    return InvoiceCreate(
+        client_id="client",
+        due_date="2024-01-31",
+        items=[InvoiceItem(description="line", quantity=quantity, rate=rate, amount=line) for quantity, rate, line in items],
+        amount=amount,
+        tax_rate=tax_rate,
+    )
+
+
+@pytest.mark.parametrize("quantity, rate, expected", [
+    (1, 0.125, 0.13),
+    (3, 1.005, 3.02),
+    (1, 0.005, 0.01),
+    (2, 0.1, 0.2),
+    (7, 19.99, 139.93),
+])
+def test_line_amounts_round_half_up(quantity, rate, expected):
+    totals = compute_invoice_totals(make_invoice([(quantity, rate, None)]))
+    assert totals["items"][0]["amount"] == expected
+    assert totals["subtotal"] == expected
+
+
+def test_tax_rounds_half_up():
+    # 18% of 0.25 is 0.045
+    totals = compute_invoice_totals(make_invoice([(1, 0.25, None)], tax_rate=18))
+    assert totals["tax"] == 0.05
+    assert totals["total"] == totals["amount"] == 0.30
+
+
+def test_flat_invoice_needs_an_amount():
+    assert compute_invoice_totals(make_invoice([], amount=99.999))["amount"] == 100.0
+    with pytest.raises(HTTPException):
+        compute_invoice_totals(make_invoice([]))
+
+
+@pytest.mark.parametrize("quantity, rate", [(1, 0.125), (3, 1.005), (1, 0.005), (1, 2.675), (1, 0.1234565)])
+def test_batch_accepts_the_amounts_the_server_stores(quantity, rate):
+    stored = compute_invoice_totals(make_invoice([(quantity, rate, None)], tax_rate=7.5))
+    invoice = make_invoice([(quantity, rate, stored["items"][0]["amount"])], amount=stored["amount"], tax_rate=7.5)
+    assert validate_invoice_batch([invoice]) == []
+
+
+def test_batch_accepts_stored_tax_with_more_places_than_checked_exactly():
+    stored = compute_invoice_totals(make_invoice([(3, 1.005, None)], tax_rate=8.0000005))
+    invoice = make_invoice([(3, 1.005, None)], amount=stored["amount"], tax_rate=8.0000005)
+    assert validate_invoice_batch([invoice]) == []
+
+
+def test_batch_reports_mismatched_invoices():
+    invoices = [
+        make_invoice([(1, 0.125, 0.13)]),
+        make_invoice([(1, 0.125, 0.12)]),
+        make_invoice([(3, 1.005, None)], amount=3.05),
+        make_invoice([], amount=10),
+        make_invoice([]),
+    ]
+    assert validate_invoice_batch(invoices) == [1, 2, 4]
+
+
+def test_batch_total_must_match_the_sum_of_rounded_lines():
+    # Summing unrounded lines gives 0.25 where the server stores 0.13 + 0.13
+    assert validate_invoice_batch([make_invoice([(1, 0.125, None), (1, 0.125, None)], amount=0.25)]) == [0]
+    assert validate_invoice_batch([make_invoice([(1, 0.125, None), (1, 0.125, None)], amount=0.26)]) == []
+
+
+def test_batch_total_tolerance_does_not_grow_with_line_count():
+    lines = [(1, 1.0, None)] * 1000
+    assert validate_invoice_batch([make_invoice(lines, amount=1000.0)]) == []
+    assert validate_invoice_batch([make_invoice(lines, amount=1005.0)]) == [0]
+    assert validate_invoice_batch([make_invoice(lines, amount=1000.01)]) == [0]
+
+
+@pytest.mark.parametrize("quantity, rate", [(10 ** 20, 1.5), (1, 1e13), (3_000_000_000, 4_000_000.25), (-(10 ** 20), 0.125)])
+def test_batch_checks_values_too_large_for_int64_exactly(quantity, rate):
+    stored = compute_invoice_totals(make_invoice([(quantity, rate, None)], tax_rate=18))
+    good = make_invoice([(quantity, rate, stored["items"][0]["amount"])], amount=stored["amount"], tax_rate=18)
+    bad = make_invoice([(quantity, rate, None)], amount=stored["amount"] * 2 + 1, tax_rate=18)
+    assert validate_invoice_batch([good, bad, make_invoice([(1, 0.125, 0.13)])]) == [1]
+
+
+def test_batch_checks_large_subtotals_and_tax_exactly():
+    # 10**13 cents times a tax rate of 10**8 millionths would overflow int64
+    lines = [(100_000, 1_000_000.0, None)]
+    stored = compute_invoice_totals(make_invoice(lines, tax_rate=99.999999))
+    good = make_invoice(lines, amount=stored["amount"], tax_rate=99.999999)
+    bad = make_invoice(lines, amount=stored["amount"] + 0.01, tax_rate=99.999999)
+    assert validate_invoice_batch([good, bad]) == [1]
+
+
+def test_invoices_stored_without_totals_report_their_amount():
+    legacy = Invoice(invoice_number="INV-00001", client_id="client", amount=120.5, due_date="2024-01-31")
+    assert (legacy.subtotal, legacy.tax, legacy.total) == (120.5, 0.0, 120.5)
@@ -0,0 +1,92 @@
+import asyncio
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from profiling import RequestTimings, TimedRepository, current_timings
+from repositories import create_memory_repositories
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(server.app) as client:
+        yield client
+
+
+def register(client, role="team_member", headers=None):
+    name = f"user-{uuid.uuid4().hex[:8]}"
+    response = client.post(
+        "/api/auth/register",
+        json={"username": name, "email": f"{name}@example.com", "password": "secret", "role": role},
+        headers=headers,
+    )
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}, response.json()["user"]
+
+
+def test_sampled_requests_are_stored_without_headers(client, monkeypatch):
+    monkeypatch.setattr(server, "PROFILE_SAMPLE_RATE", 1.0)
+    stored = len(server.profile_store.profiles)
+
+    response = client.get("/api/health")
+    assert response.status_code == 200
+    assert "Server-Timing" not in response.headers
+    assert "X-Profile-Id" not in response.headers
+    assert len(server.profile_store.profiles) == stored + 1
+
+
+def test_a_profiled_first_request_still_counts_as_the_cold_request(client, monkeypatch):
+    monkeypatch.setitem(server.worker_stats, "cold_request_ms", None)
+    monkeypatch.setattr(server, "PROFILE_SAMPLE_RATE", 1.0)
+
+    client.get("/api/health")
+    cold_request_ms = server.worker_stats["cold_request_ms"]
+    assert cold_request_ms is not None
+    client.get("/api/health")
+    assert server.worker_stats["cold_request_ms"] == cold_request_ms
+
+
+def test_only_admins_can_ask_for_timings(client):
+    admin_headers, _ = register(client)
+    member_headers, _ = register(client, headers=admin_headers)
+    member = client.get("/api/clients", headers={**member_headers, "X-Profile": "1"})
+    assert "Server-Timing" not in member.headers
+
+    admin = client.get("/api/clients", headers={**admin_headers, "X-Profile": "1"})
+    assert admin.headers["Server-Timing"].startswith("auth;dur=")
+    assert server.profile_store.get(admin.headers["X-Profile-Id"])["path"] == "/api/clients"
+
+
+def test_agency_admins_only_see_their_own_profiles(client, monkeypatch):
+    agency_a, user_a = register(client)
+    agency_b, _ = register(client)
+    profile_id = client.get("/api/clients", headers={**agency_a, "X-Profile": "1"}).headers["X-Profile-Id"]
+
+    assert client.get(f"/api/admin/profiles/{profile_id}", headers=agency_a).status_code == 200
+    assert client.get(f"/api/admin/profiles/{profile_id}", headers=agency_b).status_code == 404
+    assert profile_id not in {profile["id"] for profile in client.get("/api/admin/profiles", headers=agency_b).json()}
+
+    monkeypatch.setattr(server, "PLATFORM_ADMINS", {user_a["username"]})
+    monkeypatch.setattr(server, "PROFILE_SAMPLE_RATE", 1.0)
+    assert client.get("/api/health").status_code == 200
+    anonymous_id = server.profile_store.summaries()[0]["id"]
+    assert anonymous_id in {profile["id"] for profile in client.get("/api/admin/profiles", headers=agency_a).json()}
+    assert anonymous_id not in {profile["id"] for profile in client.get("/api/admin/profiles", headers=agency_b).json()}
+
+
+def test_timed_repository_wraps_each_method_once():
+    timed = TimedRepository(create_memory_repositories().clients)
+    assert timed.count is timed.count
+
+    async def count_profiled():
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        try:
+            await timed.count({})
+        finally:
+            current_timings.reset(token)
+        return timings
+
+    assert asyncio.run(count_profiled()).phases["db"] > 0
+    assert asyncio.run(timed.count({})) == 0
@@ -0,0 +1,83 @@
+import asyncio
+import ipaddress
+
+import pytest
+from starlette.requests import Request
+
+import rate_limit
+import server
+from rate_limit import LocalBucketStore, RateLimiter
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_bucket_allows_a_burst_then_refills(clock):
+    store = LocalBucketStore()
+    assert [run(store.take("k", 3, 1.0))[0] for _ in range(4)] == [True, True, True, False]
+
+    allowed, retry_after = run(store.take("k", 3, 1.0))
+    assert not allowed and retry_after == pytest.approx(1.0)
+
+    clock[0] += 1.5
+    assert run(store.take("k", 3, 1.0)) == (True, 0.0)
+    assert run(store.take("k", 3, 1.0))[0] is False
+
+
+def test_bucket_never_refills_past_capacity(clock):
+    store = LocalBucketStore()
+    run(store.take("k", 2, 1.0))
+    clock[0] += 3600
+    assert [run(store.take("k", 2, 1.0))[0] for _ in range(3)] == [True, True, False]
+
+
+def test_least_recently_used_buckets_are_evicted(clock):
+    store = LocalBucketStore(max_keys=2)
+    for key in ("a", "b", "a", "c"):
+        run(store.take(key, 1, 0.001))
+    # "a" was used again after "b", so "b" was evicted and starts over with a full bucket
+    assert run(store.take("a", 1, 0.001))[0] is False
+    assert run(store.take("b", 1, 0.001))[0] is True
+
+
+def test_limiter_checks_ip_and_username_separately(clock):
+    limiter = RateLimiter(LocalBucketStore(), ip_burst=2, ip_per_minute=60, user_burst=2, user_per_minute=60)
+
+    assert run(limiter.admit("10.0.0.1", "alice"))[0]
+    assert run(limiter.admit("10.0.0.2", "alice"))[0]
+    # A third attempt on the same username is refused from any address
+    assert run(limiter.admit("10.0.0.3", "alice"))[0] is False
+    assert run(limiter.admit("10.0.0.1", "bob"))[0]
+    assert run(limiter.admit("10.0.0.1", "carol"))[0] is False
+    assert run(limiter.admit(None, "dave"))[0]
+
+    assert limiter.counters == {"allowed": 4, "rejected_username": 1, "rejected_ip": 1}
+
+
+def make_request(peer, forwarded_for=None):
+    headers = [(b"x-forwarded-for", forwarded_for.encode())] if forwarded_for else []
+    return Request({"type": "http", "client": (peer, 50000), "headers": headers})
+
+
+@pytest.mark.parametrize("peer, forwarded_for, expected", [
+    # Direct connections and untrusted peers cannot choose their own address
+    ("203.0.113.7", None, "203.0.113.7"),
+    ("203.0.113.7", "198.51.100.1", "203.0.113.7"),
+    # Through the ingress the nearest untrusted hop is the client, whatever it put in front
+    ("10.0.0.5", "198.51.100.1", "198.51.100.1"),
+    ("10.0.0.5", "1.2.3.4, 198.51.100.1, 10.0.0.9", "198.51.100.1"),
+    ("10.0.0.5", "not-an-ip", "not-an-ip"),
+    ("10.0.0.5", None, "10.0.0.5"),
+    ("10.0.0.5", "10.0.0.9", "10.0.0.9"),
+])
+def test_client_ip_looks_through_trusted_proxies(monkeypatch, peer, forwarded_for, expected):
+    monkeypatch.setattr(server, "TRUSTED_PROXIES", [ipaddress.ip_network("10.0.0.0/8")])
+    assert server.client_ip(make_request(peer, forwarded_for)) == expected
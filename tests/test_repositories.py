@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+
+from rate_limit import BucketStore
+from repositories import Repository, create_memory_repositories, matches
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def repos():
+    return create_memory_repositories()
+
+
+def project(project_id, status="active", team_members=(), budget=None, tenant_id="agency-a", **fields):
+    return {"id": project_id, "tenant_id": tenant_id, "client_id": "client", "status": status,
+            "team_members": list(team_members), "budget": budget, **fields}
+
+
+@pytest.mark.parametrize("query, expected", [
+    ({"status": "active"}, True),
+    ({"status": "paid"}, False),
+    ({"team_members": "u1"}, True),
+    ({"team_members": "u9"}, False),
+    ({"status": {"$in": ["paid", "active"]}}, True),
+    ({"team_members": {"$in": ["u9", "u2"]}}, True),
+    ({"status": {"$nin": ["active"]}}, False),
+    ({"team_members": {"$nin": ["u9"]}}, True),
+    ({"status": {"$ne": "active"}}, False),
+    ({"budget": {"$gt": 100, "$lte": 250}}, True),
+    ({"budget": {"$lt": 100}}, False),
+    ({"budget": {"$gte": "a"}}, False),
+    ({"archived_at": {"$exists": False}}, True),
+    ({"budget": {"$exists": True}}, True),
+    ({"status": "active", "budget": {"$gt": 250}}, False),
+])
+def test_matches_operators(query, expected):
+    doc = project("p1", team_members=["u1", "u2"], budget=250)
+    assert matches(doc, query) is expected
+
+
+def test_matches_rejects_unknown_operators():
+    with pytest.raises(ValueError):
+        matches(project("p1"), {"status": {"$regex": "act"}})
+
+
+@pytest.mark.parametrize("interface", [Repository, BucketStore])
+def test_storage_interfaces_are_abstract(interface):
+    with pytest.raises(TypeError):
+        interface()
+
+
+def test_candidates_use_the_smallest_index_bucket(repos):
+    projects = repos.projects
+    for index in range(6):
+        run(projects.insert_one(project(f"p{index}", status="active" if index % 2 else "completed", client_id=f"c{index % 3}")))
+
+    # client_id c0 has two documents against three active ones; the filter then narrows them down
+    assert projects._candidates({"status": "active", "client_id": "c0"}) == ["p0", "p3"]
+    assert run(projects.find({"status": "active", "client_id": "c0"}, {"id": 1})) == [{"id": "p3"}]
+    assert projects._candidates({"id": {"$in": ["p4", "p1", "missing"]}}) == ["p1", "p4"]
+    # Unindexed fields and range operators fall back to a scan in insertion order
+    assert projects._candidates({"name": "x"}) == [f"p{index}" for index in range(6)]
+    assert projects._candidates({"status": {"$ne": "active"}}) == [f"p{index}" for index in range(6)]
+
+
+def test_updates_move_documents_between_index_buckets(repos):
+    projects = repos.projects
+    run(projects.insert_one(project("p1", team_members=["u1"])))
+    run(projects.update_one({"id": "p1"}, {"status": "completed", "team_members": ["u2"]}))
+
+    assert projects._candidates({"status": "active"}) == []
+    assert projects._candidates({"team_members": "u1"}) == []
+    assert run(projects.find({"status": "completed", "team_members": "u2"}, {"id": 1})) == [{"id": "p1"}]
+
+
+def test_find_sorts_pages_and_projects(repos):
+    activity = repos.activity
+    run(activity.insert_many([{"id": f"a{index}", "tenant_id": "agency-a", "at": f"2024-01-0{index}"} for index in range(1, 6)]))
+
+    page = run(activity.find({}, {"id": 1}, skip=1, limit=2, sort=[("at", -1)]))
+    assert page == [{"id": "a4"}, {"id": "a3"}]
+    assert "tenant_id" not in run(activity.find_one({"id": "a1"}, {"tenant_id": 0}))
+    with pytest.raises(ValueError):
+        run(activity.insert_one({"id": "a1"}))
+
+
+def test_returned_documents_are_copies(repos):
+    clients = repos.clients
+    run(clients.insert_one({"id": "c1", "tenant_id": "agency-a", "tags": ["x"]}))
+    run(clients.find_one({"id": "c1"}))["tags"].append("y")
+    assert run(clients.find_one({"id": "c1"}))["tags"] == ["x"]
+
+
+def test_tenant_view_scopes_reads_and_writes(repos):
+    agency_a, agency_b = repos.for_tenant("agency-a"), repos.for_tenant("agency-b")
+    run(agency_a.clients.insert_one({"id": "c1", "name": "Acme"}))
+    run(agency_b.clients.insert_one({"id": "c2", "name": "Acme"}))
+
+    assert run(agency_a.clients.find({"name": "Acme"})) == [{"id": "c1", "name": "Acme", "tenant_id": "agency-a"}]
+    assert run(agency_b.clients.find_one({"id": "c1"})) is None
+    assert run(agency_b.clients.count({})) == 1
+    assert run(agency_b.clients.update_one({"id": "c1"}, {"name": "Taken"})) is False
+    assert run(agency_b.clients.delete_one({"id": "c1"})) is False
+    assert run(agency_b.clients.delete_many({})) == 1
+    assert run(agency_a.clients.count({})) == 1
+
+
+def test_tenant_view_stamps_its_tenant_over_the_document(repos):
+    agency_a = repos.for_tenant("agency-a")
+    run(agency_a.clients.insert_one({"id": "c1", "tenant_id": "agency-b"}))
+    run(agency_a.clients.upsert_many([{"id": "c2", "tenant_id": "agency-b"}]))
+    assert run(repos.clients.count({"tenant_id": "agency-a"})) == 2
+
+
+def test_team_workload_is_per_tenant(repos):
+    run(repos.projects.insert_many([
+        project("p1", team_members=["u1", "u2"], budget=100),
+        project("p2", team_members=["u1"], budget=50),
+        project("p3", status="completed", team_members=["u2"]),
+        project("p4", team_members=["u1"], tenant_id="agency-b"),
+    ]))
+    agency_a = repos.for_tenant("agency-a")
+
+    assert run(agency_a.projects.team_workload()) == [
+        {"user_id": "u1", "active_projects": 2, "project_ids": ["p1", "p2"], "budget_total": 150},
+        {"user_id": "u2", "active_projects": 1, "project_ids": ["p1"], "budget_total": 100},
+    ]
+    assert run(agency_a.projects.member_projects("u1")) == [{"id": "p1", "budget": 100}, {"id": "p2", "budget": 50}]
+
+
+def test_invoice_sum_amount(repos):
+    agency_a = repos.for_tenant("agency-a")
+    run(agency_a.invoices.insert_many([
+        {"id": "i1", "status": "paid", "amount": 10.5},
+        {"id": "i2", "status": "paid", "amount": 4.5},
+        {"id": "i3", "status": "pending", "amount": 100},
+    ]))
+    run(repos.for_tenant("agency-b").invoices.insert_one({"id": "i4", "status": "paid", "amount": 1}))
+    assert run(agency_a.invoices.sum_amount({"status": "paid"})) == 15
+
+
+def test_backfill_assigns_documents_without_a_tenant(repos):
+    run(repos.clients.insert_many([{"id": "c1"}, {"id": "c2", "tenant_id": "agency-b"}]))
+    run(repos.activity.insert_one({"id": "a1"}))
+
+    backfilled = run(repos.backfill_tenant("default"))
+    assert backfilled["clients"] == backfilled["activity"] == 1
+    assert run(repos.for_tenant("default").clients.find({}, {"id": 1})) == [{"id": "c1"}]
+    assert run(repos.backfill_tenant("default"))["clients"] == 0